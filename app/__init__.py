@@ -2,6 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 import eventlet  # Asegúrate de importar eventlet
+import atexit  # Para vaciar colas pendientes al cerrar el proceso
 
 app = Flask(__name__)
 cors = CORS()
@@ -10,12 +11,70 @@ socketio = SocketIO()  # Aquí sigue inicializando el SocketIO
 def create_app():
     app.config.from_object('app.config.Config')
     
+    # JSON rápido (orjson si está instalado) con fechas ISO y Decimal
+    from app.serialitzacio import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    
     # Inicializar extensiones
     cors.init_app(app)
-    socketio.init_app(app, cors_allowed_origins="*")  # Configuración de CORS para el socket
+    # Configuración de CORS para el socket y, con varios workers, la cola de mensajes compartida
+    from app.pubsub import socketio_options
+    socketio.init_app(app, cors_allowed_origins="*", **socketio_options(app.config))
+    
+    # Sin SECRET_KEY propia los tokens de sesión se desactivan
+    from app.tokens import check_secret_key
+    check_secret_key(app)
+    
+    # Pool de conexiones a MySQL configurado desde Config
+    from app.db import init_pool
+    init_pool(app.config)
+    
+    # Cachés de la API remota de cartas: búsquedas e ids que no conoce
+    from app.cataleg import search_cache, ids_desconeguts
+    search_cache.configure(app.config['CARD_SEARCH_CACHE_SIZE'], app.config['CARD_SEARCH_CACHE_TTL'])
+    ids_desconeguts.configure(app.config['CARD_MISS_CACHE_SIZE'], app.config['CARD_MISS_CACHE_TTL'])
+    
+    # Caché nombre de usuario <-> id
+    from app.usuaris import ids_usuaris, noms_usuaris
+    ids_usuaris.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    noms_usuaris.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    
+    # Estadísticas de colecciones
+    from app.coleccions import estadistiques
+    estadistiques.configure(app.config['COLLECTION_STATS_CACHE_SIZE'], app.config['COLLECTION_STATS_CACHE_TTL'])
+    
+    # bcrypt en hilos nativos con cola acotada
+    from app import contrasenyes
+    contrasenyes.configure(app.config['BCRYPT_ROUNDS'], app.config['BCRYPT_MAX_PENDING'], app.config['BCRYPT_THREADS'])
     
     from app import routes
     app.register_blueprint(routes.api)
     
-    app.config['SECRET_KEY'] = 'x'  
+    # Latencias por ruta y evento, consultas a MySQL y llamadas a mtgsdk en /metrics
+    if app.config['METRICS_ENABLED']:
+        from app import metriques
+        metriques.init_app(app, socketio)
+    
+    # Consultas lentas y N+1 (con DEBUG, resumen en la cabecera X-Consultes-BD)
+    if app.config['QUERY_DEBUG']:
+        from app import consultes
+        consultes.init_app(app, socketio, app.config['QUERY_SLOW_MS'], app.config['QUERY_REPEAT_LIMIT'])
+    
+    # Caché pareja de usuarios -> conversación y guardado de mensajes en segundo plano (opcional)
+    from app.xat import message_writer, converses, participants
+    converses.configure(app.config['CONVERSATION_CACHE_SIZE'], app.config['CONVERSATION_CACHE_TTL'])
+    participants.configure(app.config['CONVERSATION_CACHE_SIZE'], app.config['CONVERSATION_CACHE_TTL'])
+    if app.config['CHAT_WRITE_BEHIND'] and not message_writer.enabled:
+        message_writer.configure(True, app.config['CHAT_FLUSH_INTERVAL_MS'] / 1000,
+                                 app.config['CHAT_FLUSH_MAX_MESSAGES'], app.config['CHAT_QUEUE_MAX'],
+                                 app.config['CHAT_QUEUE_TIMEOUT'])
+        socketio.start_background_task(message_writer.run)
+        atexit.register(message_writer.stop)  # Guarda los mensajes pendientes al cerrar
+        message_writer.stop_on_signals()  # ...también si el proceso se para con SIGTERM o Ctrl+C
+    
+    # Carga el índice de autocompletado en segundo plano y lo mantiene al día
+    from app.autocomplete import name_index
+    if app.config['AUTOCOMPLETE_REFRESH_INTERVAL']:
+        socketio.start_background_task(name_index.run_refresh_loop, app.config['AUTOCOMPLETE_REFRESH_INTERVAL'])
+
     return app
@@ -0,0 +1,167 @@
+import math  # Para el mínimo de trigramas compartidos
+import time  # Para el bucle de refresco periódico
+import threading  # Con eventlet.monkey_patch() el lock pasa a ser "verde"
+from bisect import bisect_left, insort  # Búsqueda por prefijo sobre la lista ordenada
+from collections import defaultdict
+from app.db import db_connection  # Pool de conexiones a la base de datos
+from app import cataleg  # Catálogo local de cartas
+
+LIMIT_PER_DEFECTE = 10  # Sugerencias devueltas si el cliente no indica límite
+LIMIT_MAXIM = 50  # Máximo de sugerencias por petición
+SIMILITUD_MINIMA = 0.3  # Similitud de trigramas mínima para aceptar una sugerencia aproximada
+
+
+def trigrams(nom):
+    nom = f"  {nom} "  # Relleno para que el inicio de la palabra tenga más peso
+    return {nom[i:i + 3] for i in range(len(nom) - 2)}
+
+
+class NameIndex:
+    """Índice en memoria de nombres de carta: prefijos (lista ordenada) y trigramas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # Solo una carga inicial a la vez
+        self._keys = []  # Nombres normalizados ordenados
+        self._names = {}  # nombre normalizado -> nombre para mostrar
+        self._claus = {}  # nombre para mostrar -> su nombre normalizado (para detectar cambios de clave)
+        self._trigrams = defaultdict(set)  # trigrama -> nombres normalizados
+        self._name_trigrams = {}  # nombre normalizado -> sus trigramas
+        self._since = None  # Marca de tiempo de la última carga (columna cartes.actualitzat)
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _add(self, nom, clau):
+        self._names[clau] = nom
+        self._claus[nom] = clau
+        self._name_trigrams[clau] = trigrams(clau)
+        for trigram in self._name_trigrams[clau]:
+            self._trigrams[trigram].add(clau)
+
+    def _remove(self, clau):
+        nom = self._names.pop(clau)
+        if self._claus.get(nom) == clau:
+            del self._claus[nom]
+        for trigram in self._name_trigrams.pop(clau):
+            self._trigrams[trigram].discard(clau)
+            if not self._trigrams[trigram]:
+                del self._trigrams[trigram]
+        i = bisect_left(self._keys, clau)
+        if i < len(self._keys) and self._keys[i] == clau:
+            del self._keys[i]
+
+    def add(self, pairs):
+        """Añade pares (nombre, nombre normalizado) que todavía no estén en el índice.
+
+        Si un nombre ya estaba con otra clave (p. ej. tras renormalizar el
+        catálogo con app.magic_api --normalitza) se quita la clave antigua.
+        """
+        with self._lock:
+            for nom, clau in pairs:
+                if not nom or not clau:
+                    continue
+                antiga = self._claus.get(nom)
+                if antiga is not None and antiga != clau and self._names.get(antiga) == nom:
+                    self._remove(antiga)
+                if clau not in self._names:
+                    self._add(nom, clau)
+                    insort(self._keys, clau)
+
+    def add_rows(self, rows):
+        # Adaptador para cataleg.upsert_listeners (filas en el orden de cataleg.COLUMNES)
+        self.add((row[1], row[2]) for row in rows)
+
+    def load(self):
+        """Carga (o recarga de cero) todos los nombres del catálogo."""
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            cursor.execute("""
+                SELECT nom, nom_normalitzat, MAX(actualitzat)
+                FROM cartes
+                WHERE nom IS NOT NULL
+                GROUP BY nom, nom_normalitzat
+            """)
+            rows = cursor.fetchall()
+        since = max((row[2] for row in rows if row[2] is not None), default=None)
+        with self._lock:
+            self._names, self._claus, self._trigrams, self._name_trigrams = {}, {}, defaultdict(set), {}
+            for nom, clau, _ in rows:
+                if clau and clau not in self._names:
+                    self._add(nom, clau)
+            self._keys = sorted(self._names)
+            self._since = since
+            self.loaded = True
+
+    def ensure_loaded(self):
+        """Carga el índice si aún no lo está; con varias peticiones a la vez solo una lee la tabla."""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:  # Las que esperaban encuentran el índice ya cargado
+                self.load()
+
+    def refresh(self):
+        """Añade solo las cartas modificadas desde la última carga."""
+        if not self.loaded:
+            return self.ensure_loaded()
+        if self._since is None:
+            return self.load()
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            cursor.execute("""
+                SELECT nom, nom_normalitzat, actualitzat
+                FROM cartes
+                WHERE nom IS NOT NULL AND actualitzat >= %s
+            """, (self._since,))
+            rows = cursor.fetchall()
+        self.add((nom, clau) for nom, clau, _ in rows)
+        since = max((row[2] for row in rows if row[2] is not None), default=None)
+        if since is not None:
+            self._since = max(self._since, since)
+
+    def run_refresh_loop(self, interval):
+        # Tarea en segundo plano: carga inicial y refresco incremental periódico
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error al refrescar l'índex de noms: {e}")
+            time.sleep(interval)
+
+    def search(self, q, limit=LIMIT_PER_DEFECTE, fuzzy=True):
+        """Devuelve hasta `limit` nombres: primero los que empiezan por q, luego los parecidos."""
+        clau = cataleg.normalize_name(q)
+        if not clau:
+            return []
+        with self._lock:
+            resultats = []
+            i = bisect_left(self._keys, clau)
+            while i < len(self._keys) and len(resultats) < limit and self._keys[i].startswith(clau):
+                resultats.append(self._keys[i])
+                i += 1
+
+            if fuzzy and len(resultats) < limit and len(clau) >= 3:
+                # Un candidato con similitud suficiente comparte al menos `minim` trigramas,
+                # así que basta con mirar los nombres de los trigramas menos frecuentes
+                q_trigrams = trigrams(clau)
+                minim = max(1, math.ceil(SIMILITUD_MINIMA * len(q_trigrams)))
+                rars = sorted(q_trigrams, key=lambda t: len(self._trigrams.get(t, ())))
+                possibles = set()
+                for trigram in rars[:len(rars) - minim + 1]:
+                    possibles.update(self._trigrams.get(trigram, ()))
+                possibles.difference_update(resultats)
+                candidats = []
+                for candidat in possibles:
+                    c_trigrams = self._name_trigrams[candidat]
+                    n = len(q_trigrams & c_trigrams)
+                    similitud = n / (len(q_trigrams) + len(c_trigrams) - n)  # Índice de Jaccard
+                    if similitud >= SIMILITUD_MINIMA:
+                        candidats.append((-similitud, candidat))
+                candidats.sort()
+                resultats.extend(candidat for _, candidat in candidats[:limit - len(resultats)])
+
+            return [self._names[r] for r in resultats]
+
+
+name_index = NameIndex()
+cataleg.upsert_listeners.append(name_index.add_rows)  # Añade las cartas nuevas al instante
@@ -0,0 +1,81 @@
+import time  # Para calcular la caducidad de las entradas
+import threading  # Con eventlet.monkey_patch() el lock pasa a ser "verde"
+from collections import OrderedDict  # Mantiene el orden de uso para el LRU
+
+_MISSING = object()  # Marca para distinguir "no está" de un valor None guardado
+
+caches = {}  # Cachés registradas por nombre, para exponer sus estadísticas
+
+
+class TTLCache:
+    """Caché LRU acotada con caducidad por entrada y contadores de aciertos."""
+
+    def __init__(self, name, maxsize=1024, ttl=300):
+        self.name = name
+        self.maxsize = maxsize  # Entradas máximas antes de expulsar la menos usada
+        self.ttl = ttl  # Segundos de vida de cada entrada (0 = sin caducidad)
+        self._data = OrderedDict()  # clave -> (valor, caduca_en)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        caches[name] = self
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._trim()
+
+    def _trim(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires = item
+                if not expires or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]  # Entrada caducada
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            expires = time.monotonic() + self.ttl if self.ttl else 0
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            self._trim()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+def cache_stats():
+    """Devuelve las estadísticas de todas las cachés registradas."""
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,170 @@
+import unicodedata  # Para quitar acentos al normalizar nombres
+from mtgsdk import Card  # Importa la biblioteca para interactuar con la API de cartas
+from app.cache import TTLCache  # Caché LRU con caducidad
+from app.db import db_connection  # Pool de conexiones a la base de datos
+
+# Columnas del catálogo local (tabla `cartes`, ver sql/001_cataleg_cartes.sql)
+COLUMNES = ('id_carta', 'nom', 'nom_normalitzat', 'imatge', 'expansio', 'nom_expansio',
+            'tipus', 'cost_mana', 'cmc', 'colors', 'raresa')
+
+# Máximo de ids por consulta a la API remota (coincide con su tamaño de página)
+MIDA_CONSULTA_REMOTA = 100
+
+# Máximo de cartas devueltas por una búsqueda por nombre
+LIMIT_CERCA = 100
+
+# Resultados de la API remota por nombre normalizado (se configura en create_app)
+search_cache = TTLCache('cerca_cartes', maxsize=1024, ttl=3600)
+
+# Ids que la API remota no conoce, para no volver a pedirlos en cada consulta (se configura en create_app)
+ids_desconeguts = TTLCache('cartes_desconegudes', maxsize=10000, ttl=3600)
+
+# Funciones a las que se avisa con las filas guardadas en cada upsert (p. ej. el índice de nombres)
+upsert_listeners = []
+
+UPSERT_CARTES = """
+    INSERT INTO cartes ({columnes})
+    VALUES ({valors})
+    ON DUPLICATE KEY UPDATE {actualitzacions}
+""".format(
+    columnes=', '.join(COLUMNES),
+    valors=', '.join(['%s'] * len(COLUMNES)),
+    actualitzacions=', '.join(f"{c} = VALUES({c})" for c in COLUMNES[1:]),
+)
+
+
+def normalize_name(nom):
+    """Normaliza un nombre de carta: minúsculas, sin acentos y sin espacios repetidos."""
+    if nom is None:
+        return None
+    nom = unicodedata.normalize('NFKD', nom)
+    nom = ''.join(c for c in nom if not unicodedata.combining(c))
+    return ' '.join(nom.replace('æ', 'ae').replace('Æ', 'ae').lower().split())
+
+
+def card_to_row(card):
+    """Convierte una carta de mtgsdk en una fila del catálogo local."""
+    return (
+        int(card.multiverse_id),
+        card.name,
+        normalize_name(card.name),
+        card.image_url,
+        card.set,
+        card.set_name,
+        card.type,
+        card.mana_cost,
+        card.cmc,
+        ','.join(card.colors) if card.colors else None,
+        card.rarity,
+    )
+
+
+def upsert_cards(cursor, cards):
+    """Inserta o actualiza un lote de cartas con una sola sentencia. Devuelve las filas enviadas."""
+    rows = [card_to_row(card) for card in cards if card.multiverse_id is not None]
+    if rows:
+        cursor.executemany(UPSERT_CARTES, rows)
+        for listener in upsert_listeners:
+            listener(rows)
+    return len(rows)
+
+
+def fetch_remote_cards(ids):
+    """Busca en la API remota las cartas con los multiverse ids indicados, por bloques."""
+    ids = [str(i) for i in ids]
+    cards = []
+    for i in range(0, len(ids), MIDA_CONSULTA_REMOTA):
+        bloc = ids[i:i + MIDA_CONSULTA_REMOTA]
+        # La API acepta varios valores separados por '|' (OR)
+        cards.extend(Card.where(multiverseid='|'.join(bloc), pageSize=MIDA_CONSULTA_REMOTA).all())
+    return cards
+
+
+def resolve_cards(ids):
+    """Devuelve {id_carta: fila} para los ids indicados.
+
+    Lee el catálogo local con una sola consulta; solo los ids que no están (o
+    no tienen datos) se piden a la API remota y se guardan en el catálogo.
+    La conexión se devuelve al pool mientras se espera a la API, y los ids
+    que la API no conoce se recuerdan en ids_desconeguts.
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))  # Elimina duplicados manteniendo el orden
+    if not ids:
+        return {}
+
+    with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+        marcadors = ', '.join(['%s'] * len(ids))
+        cursor.execute(
+            f"SELECT {', '.join(COLUMNES)} FROM cartes WHERE id_carta IN ({marcadors}) AND nom IS NOT NULL",
+            ids,
+        )
+        cartes = {fila['id_carta']: fila for fila in cursor.fetchall()}
+
+    desconegudes = [i for i in ids if i not in cartes and ids_desconeguts.get(i) is None]
+    if not desconegudes:
+        return cartes
+    remotes = [card for card in fetch_remote_cards(desconegudes) if card.multiverse_id is not None]
+    for card in remotes:
+        cartes[int(card.multiverse_id)] = dict(zip(COLUMNES, card_to_row(card)))
+    for i in desconegudes:
+        if i not in cartes:
+            ids_desconeguts.set(i, True)
+    if remotes:
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            upsert_cards(cursor, remotes)
+            cnx.commit()  # Guarda las cartas nuevas en el catálogo
+    return cartes
+
+
+def search_local(nom, prefix=False, limit=LIMIT_CERCA):
+    """Busca en el catálogo local por nombre normalizado (exacto o por prefijo)."""
+    clau = normalize_name(nom)
+    with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+        if prefix:
+            # Escapa los comodines de LIKE para que el prefijo sea literal
+            patro = clau.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            cursor.execute(f"""
+                SELECT {', '.join(COLUMNES)} FROM cartes
+                WHERE nom_normalitzat LIKE %s
+                ORDER BY nom_normalitzat, id_carta
+                LIMIT %s
+            """, (patro, limit))
+        else:
+            cursor.execute(f"""
+                SELECT {', '.join(COLUMNES)} FROM cartes
+                WHERE nom_normalitzat = %s
+                ORDER BY id_carta
+                LIMIT %s
+            """, (clau, limit))
+        return cursor.fetchall()
+
+
+def search_remote(nom):
+    """Busca en la API remota las impresiones con ese nombre exacto (sin distinguir mayúsculas).
+
+    El resultado se guarda en search_cache y las cartas encontradas se
+    añaden al catálogo local para que la próxima búsqueda no salga de la base de datos.
+    Mientras se espera a la API no se ocupa ninguna conexión del pool.
+    """
+    clau = normalize_name(nom)
+    files = search_cache.get(clau)
+    if files is not None:
+        return files
+
+    cards = [card for card in Card.where(name=nom).all()
+             if card.multiverse_id is not None and normalize_name(card.name) == clau]
+    if cards:
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            upsert_cards(cursor, cards)
+            cnx.commit()
+    files = [dict(zip(COLUMNES, card_to_row(card))) for card in cards]
+    search_cache.set(clau, files)
+    return files
+
+
+def search_cards(nom, prefix=False, limit=LIMIT_CERCA):
+    """Busca cartas por nombre en el catálogo local y, si no hay ninguna, en la API remota."""
+    files = search_local(nom, prefix, limit)
+    if files or prefix:
+        return files
+    return search_remote(nom)[:limit]
@@ -0,0 +1,86 @@
+from app.cache import TTLCache  # Caché LRU con caducidad
+
+# id_coleccio -> estadísticas (se configura en create_app y se invalida al cambiar la colección)
+estadistiques = TTLCache('estadistiques_coleccio', maxsize=1000, ttl=300)
+
+# Tipos principales de carta que se cuentan por separado (una carta puede tener varios)
+TIPUS = ('Creature', 'Instant', 'Sorcery', 'Artifact', 'Enchantment', 'Planeswalker', 'Land', 'Battle')
+
+CMC_MAXIM = 7  # La curva de maná agrupa 7 o más en el mismo punto
+
+
+def _stats(cursor, id_col):
+    cursor.execute("""
+        SELECT COALESCE(SUM(cc.quantitat), 0) AS copies,
+               COUNT(*) AS cartes_diferents,
+               COALESCE(SUM(CASE WHEN c.nom IS NULL THEN cc.quantitat ELSE 0 END), 0) AS sense_dades
+        FROM coleccio_cartes cc
+        LEFT JOIN cartes c ON c.id_carta = cc.id_carta
+        WHERE cc.id_coleccio = %s
+    """, (id_col,))
+    stats = {clau: int(valor) for clau, valor in cursor.fetchone().items()}  # SUM devuelve Decimal
+
+    cursor.execute("""
+        SELECT c.expansio, c.nom_expansio, SUM(cc.quantitat) AS copies, COUNT(*) AS cartes_diferents
+        FROM coleccio_cartes cc
+        JOIN cartes c ON c.id_carta = cc.id_carta
+        WHERE cc.id_coleccio = %s AND c.nom IS NOT NULL
+        GROUP BY c.expansio, c.nom_expansio
+        ORDER BY copies DESC, c.expansio
+    """, (id_col,))
+    stats['expansions'] = [{**fila, 'copies': int(fila['copies'])} for fila in cursor.fetchall()]
+
+    # Los colores se guardan como 'White,Blue': se agrupan por combinación y se reparten aquí
+    cursor.execute("""
+        SELECT c.colors, SUM(cc.quantitat) AS copies
+        FROM coleccio_cartes cc
+        JOIN cartes c ON c.id_carta = cc.id_carta
+        WHERE cc.id_coleccio = %s AND c.nom IS NOT NULL
+        GROUP BY c.colors
+    """, (id_col,))
+    colors = {}
+    for fila in cursor.fetchall():
+        for color in (fila['colors'] or 'Colorless').split(','):
+            colors[color] = colors.get(color, 0) + int(fila['copies'])
+    stats['colors'] = colors
+
+    cursor.execute("""
+        SELECT {tipus}
+        FROM coleccio_cartes cc
+        JOIN cartes c ON c.id_carta = cc.id_carta
+        WHERE cc.id_coleccio = %s AND c.nom IS NOT NULL
+    """.format(tipus=', '.join(
+        f"COALESCE(SUM(CASE WHEN c.tipus LIKE '%%{t}%%' THEN cc.quantitat ELSE 0 END), 0) AS `{t}`" for t in TIPUS
+    )), (id_col,))
+    stats['tipus'] = {t: int(n) for t, n in cursor.fetchone().items()}
+
+    # Curva de maná sin tierras
+    cursor.execute("""
+        SELECT LEAST(FLOOR(COALESCE(c.cmc, 0)), %s) AS cmc, SUM(cc.quantitat) AS copies
+        FROM coleccio_cartes cc
+        JOIN cartes c ON c.id_carta = cc.id_carta
+        WHERE cc.id_coleccio = %s AND c.nom IS NOT NULL AND COALESCE(c.tipus, '') NOT LIKE '%%Land%%'
+        GROUP BY 1
+        ORDER BY 1
+    """, (CMC_MAXIM, id_col))
+    stats['corba_mana'] = {int(fila['cmc']): int(fila['copies']) for fila in cursor.fetchall()}
+    return stats
+
+
+def collection_stats(cnx, id_col):
+    """Resumen de una colección (copias, expansiones, colores, tipos y curva de maná), usando la caché."""
+    stats = estadistiques.get(id_col)
+    if stats is None:
+        with cnx.cursor(dictionary=True) as cursor:
+            stats = _stats(cursor, id_col)
+        estadistiques.set(id_col, stats)
+    return stats
+
+
+def invalidate_stats(id_col):
+    """Descarta las estadísticas guardadas de una colección (llamar después del commit).
+
+    Solo afecta a este proceso: los demás workers las renuevan al caducar
+    (COLLECTION_STATS_CACHE_TTL).
+    """
+    estadistiques.invalidate(int(id_col))
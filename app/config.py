@@ -1,15 +1,119 @@
+import os
+
 class Config:
     # Dirección del servidor MySQL (puede ser una IP o un nombre de dominio)
     MYSQL_HOST = '10.100.3.25'  # O la dirección de tu servidor PHPMyAdmin
-    
+
+    # Puerto del servidor MySQL
+    MYSQL_PORT = 3306
+
     # Nombre de usuario para conectarse a la base de datos MySQL
     MYSQL_USER = 'root'
-    
+
     # Contraseña del usuario de la base de datos MySQL
     MYSQL_PASSWORD = ''  # Dejar vacío si no hay contraseña, pero no es recomendable en producción
-    
+
     # Nombre de la base de datos a la que se desea conectar
     MYSQL_DB = 'la_trobada'
-    
+
     # Clase de cursor que se utilizará para las consultas (en este caso, un cursor que devuelve diccionarios)
-    MYSQL_CURSORCLASS = 'DictCursor'
\ No newline at end of file
+    MYSQL_CURSORCLASS = 'DictCursor'
+
+    # Conexiones que el pool mantiene abiertas de forma permanente
+    MYSQL_POOL_SIZE = 5
+
+    # Conexiones extra que se pueden abrir en picos de carga (se cierran al devolverse)
+    MYSQL_POOL_MAX_OVERFLOW = 10
+
+    # Segundos máximos que una petición espera a que haya una conexión libre
+    MYSQL_POOL_TIMEOUT = 10
+
+    # Segundos de inactividad tras los que una conexión se cierra y se abre de nuevo
+    MYSQL_POOL_RECYCLE = 3600
+
+    # Comprueba con un ping que la conexión sigue viva antes de entregarla
+    MYSQL_POOL_PRE_PING = True
+
+    # Entradas máximas de la caché de búsquedas de cartas en la API remota
+    CARD_SEARCH_CACHE_SIZE = 1024
+
+    # Segundos que se guarda una búsqueda de la API remota
+    CARD_SEARCH_CACHE_TTL = 3600
+
+    # Entradas máximas de la caché de ids de carta que la API remota no conoce
+    CARD_MISS_CACHE_SIZE = 10000
+
+    # Segundos que se recuerda que la API no conoce un id (no se vuelve a pedir mientras tanto)
+    CARD_MISS_CACHE_TTL = 3600
+
+    # Segundos entre refrescos incrementales del índice de autocompletado (0 = sin refresco)
+    AUTOCOMPLETE_REFRESH_INTERVAL = 300
+
+    # Entradas máximas de la caché nombre de usuario <-> id
+    USER_CACHE_SIZE = 10000
+
+    # Segundos que se guarda un usuario en la caché (acota el retraso tras un cambio de nombre en otro proceso)
+    USER_CACHE_TTL = 600
+
+    # Factor de trabajo de bcrypt para las contraseñas nuevas (las antiguas siguen validando)
+    BCRYPT_ROUNDS = 12
+
+    # Hilos nativos que calculan bcrypt sin bloquear eventlet
+    BCRYPT_THREADS = 4
+
+    # Operaciones de bcrypt en cola o en curso antes de responder 503 (protege de avalanchas de login)
+    BCRYPT_MAX_PENDING = 32
+
+    # Clave para firmar los tokens de sesión (variable de entorno SECRET_KEY).
+    # Con el valor por defecto los tokens no se emiten ni se aceptan (ver app.tokens).
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'x')
+
+    # Segundos de validez de un token de sesión
+    TOKEN_MAX_AGE = 7 * 24 * 3600
+
+    # Cola de mensajes compartida entre workers de Socket.IO (p. ej. 'redis://localhost:6379/0').
+    # None = un solo proceso; 'memory://' = cola en memoria para pruebas.
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+    # Canal de la cola de mensajes (separa varias instalaciones en el mismo broker)
+    SOCKETIO_CHANNEL = 'la_trobada'
+
+    # Guarda los mensajes del chat en segundo plano: se emiten al instante y se insertan por lotes
+    CHAT_WRITE_BEHIND = False
+
+    # Milisegundos máximos que un mensaje espera a guardarse
+    CHAT_FLUSH_INTERVAL_MS = 50
+
+    # Mensajes máximos por INSERT
+    CHAT_FLUSH_MAX_MESSAGES = 200
+
+    # Mensajes pendientes de guardar antes de frenar a los remitentes
+    CHAT_QUEUE_MAX = 5000
+
+    # Segundos que un remitente espera con la cola llena antes de recibir un error
+    CHAT_QUEUE_TIMEOUT = 1.0
+
+    # Entradas máximas de la caché pareja de usuarios -> conversación
+    CONVERSATION_CACHE_SIZE = 10000
+
+    # Segundos que se guarda una conversación en la caché (las conversaciones no se borran)
+    CONVERSATION_CACHE_TTL = 3600
+
+    # Entradas máximas de la caché de estadísticas de colecciones
+    COLLECTION_STATS_CACHE_SIZE = 1000
+
+    # Segundos que se guardan las estadísticas. Se invalidan al cambiar la colección, pero solo en
+    # el proceso que hace el cambio: con varios workers acota el retraso de los demás
+    COLLECTION_STATS_CACHE_TTL = 300
+
+    # Instrumentación y endpoint /metrics de Prometheus (METRICS_ENABLED=1 para activarla)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+
+    # Detector de consultas lentas y N+1 para desarrollo y preproducción (QUERY_DEBUG=1 para activarlo)
+    QUERY_DEBUG = os.environ.get('QUERY_DEBUG', '0') == '1'
+
+    # Milisegundos a partir de los cuales una consulta se escribe en el log
+    QUERY_SLOW_MS = 200
+
+    # Veces que una misma forma de consulta puede repetirse en una petición antes de marcarla como N+1
+    QUERY_REPEAT_LIMIT = 5
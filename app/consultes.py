@@ -0,0 +1,138 @@
+import os
+import re  # Para normalizar el SQL (quitar literales)
+import time
+import threading  # Con eventlet.monkey_patch() threading.local es local a cada greenlet
+import traceback  # Para encontrar la línea de la app que lanza cada consulta
+from collections import Counter
+from functools import wraps
+from flask import current_app, request
+
+SLOW_MS = 200  # Consultas más lentas que esto se escriben en el log (se configura en create_app)
+REPEAT_LIMIT = 5  # Una misma forma de SQL más de K veces en una petición se marca como N+1
+
+enabled = False
+_local = threading.local()  # Consultas de la petición o evento en curso
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_IGNORATS = (os.path.join(_APP_DIR, 'db.py'), os.path.abspath(__file__),
+             os.path.join(_APP_DIR, 'metriques.py'))
+
+_CADENES = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LLISTES = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_FILES = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+_ESPAIS = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Forma de la consulta sin literales: las que solo cambian de parámetros coinciden."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _CADENES.sub('?', sql)
+    sql = _NUMEROS.sub('?', sql)
+    sql = _LLISTES.sub('(...)', sql)  # IN (?, ?, ?) y VALUES (?, ?) de cualquier longitud
+    sql = _FILES.sub(r'\1', sql)  # INSERT de varias filas
+    return _ESPAIS.sub(' ', sql).strip()
+
+
+def _call_site():
+    # Primera línea de la app (fuera del pool y de los ganchos) que ha llegado a la consulta
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(_APP_DIR) and frame.filename not in _IGNORATS:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    return '?'
+
+
+def _record(sql, durada):
+    forma = normalize_sql(sql)
+    lloc = _call_site()
+    if durada * 1000 >= SLOW_MS:
+        print(f"[consulta lenta] {durada * 1000:.1f} ms {lloc}: {forma}")
+    consultes = getattr(_local, 'consultes', None)
+    if consultes is not None:
+        consultes.append((forma, durada, lloc))
+
+
+def _instrument_connection(cnx):
+    # Todos los cursores (también executemany) pasan por cmd_query
+    original = cnx.cmd_query
+
+    @wraps(original)
+    def cmd_query(query, *args, **kwargs):
+        inici = time.perf_counter()
+        try:
+            return original(query, *args, **kwargs)
+        finally:
+            _record(query, time.perf_counter() - inici)
+
+    cnx.cmd_query = cmd_query
+
+
+def _begin():
+    _local.consultes = []
+
+
+def _end(nom):
+    """Cierra el ámbito: avisa de las formas repetidas y devuelve el resumen."""
+    consultes = getattr(_local, 'consultes', None)
+    _local.consultes = None
+    if consultes is None:
+        return None
+    formes = Counter(forma for forma, _, _ in consultes)
+    repetides = [(forma, n) for forma, n in formes.most_common() if n > REPEAT_LIMIT]
+    for forma, n in repetides:
+        llocs = sorted({lloc for f, _, lloc in consultes if f == forma})
+        print(f"[N+1] {nom}: {n} consultes amb la mateixa forma des de {', '.join(llocs)}: {forma}")
+    return {
+        'consultes': len(consultes),
+        'ms': sum(durada for _, durada, _ in consultes) * 1000,
+        'repetides': repetides,
+    }
+
+
+def _before_request():
+    _begin()
+
+
+def _after_request(response):
+    ruta = request.url_rule.rule if request.url_rule is not None else request.path
+    resum = _end(f"{request.method} {ruta}")
+    if resum is not None and current_app.debug:
+        response.headers['X-Consultes-BD'] = (
+            f"{resum['consultes']} consultes; {resum['ms']:.1f} ms; {len(resum['repetides'])} repetides"
+        )
+        if resum['repetides']:
+            forma, n = resum['repetides'][0]
+            # Las cabeceras deben ser latin-1: se recorta y se limpia la forma más repetida
+            response.headers['X-Consultes-BD-Repetida'] = f"{n}x {forma[:200]}".encode('ascii', 'replace').decode()
+    return response
+
+
+def _scoped_event(event, handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        _begin()
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            _end(f"socketio {event}")
+    return wrapper
+
+
+def init_app(app, socketio, slow_ms=None, repeat_limit=None):
+    """Activa el detector de consultas lentas y N+1. Llamar después de registrar las rutas."""
+    global enabled, SLOW_MS, REPEAT_LIMIT
+    if slow_ms is not None:
+        SLOW_MS = slow_ms
+    if repeat_limit is not None:
+        REPEAT_LIMIT = repeat_limit
+    if enabled:
+        return
+    enabled = True
+
+    from app.db import connect_listeners
+    connect_listeners.append(_instrument_connection)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    for handlers in socketio.server.handlers.values():
+        for event, handler in list(handlers.items()):
+            handlers[event] = _scoped_event(event, handler)
@@ -0,0 +1,91 @@
+import time  # Para medir la espera y la duración de cada hash
+import threading  # Con eventlet.monkey_patch() el semáforo pasa a ser "verde"
+import bcrypt  # Importa la biblioteca para el hashing de contraseñas
+from eventlet import patcher, tpool  # Pool de hilos nativos de eventlet
+
+ROUNDS = 12  # Factor de trabajo de bcrypt (se configura en create_app)
+MAX_PENDENTS = 32  # Operaciones de bcrypt en cola o en curso antes de rechazar con 503
+
+
+class PasswordPoolBusy(Exception):
+    """Hay demasiadas operaciones de bcrypt pendientes; la petición debe reintentarse."""
+
+
+_pendents = threading.BoundedSemaphore(MAX_PENDENTS)
+_lock = threading.Lock()
+_stats = {
+    'operacions': 0,  # Hashes y verificaciones completados
+    'rebutjades': 0,  # Peticiones rechazadas por cola llena
+    'temps_hash': 0.0,  # Segundos totales calculando bcrypt
+    'temps_hash_max': 0.0,
+    'temps_espera': 0.0,  # Segundos totales esperando un hilo libre
+    'temps_espera_max': 0.0,
+}
+
+
+def configure(rounds=None, max_pending=None, threads=None):
+    global ROUNDS, MAX_PENDENTS, _pendents
+    if threads:
+        tpool.set_num_threads(threads)  # Hilos nativos de eventlet (antes del primer uso)
+    if rounds is not None:
+        ROUNDS = rounds
+    if max_pending is not None:
+        MAX_PENDENTS = max_pending
+        _pendents = threading.BoundedSemaphore(max_pending)
+
+
+def _record(espera, durada):
+    with _lock:
+        _stats['operacions'] += 1
+        _stats['temps_hash'] += durada
+        _stats['temps_hash_max'] = max(_stats['temps_hash_max'], durada)
+        _stats['temps_espera'] += espera
+        _stats['temps_espera_max'] = max(_stats['temps_espera_max'], espera)
+
+
+def _run(func, *args):
+    # bcrypt bloquea ~100-300 ms: con eventlet se ejecuta en un hilo nativo
+    # (tpool) para no congelar el resto de peticiones y sockets.
+    pendents = _pendents
+    if not pendents.acquire(blocking=False):
+        with _lock:
+            _stats['rebutjades'] += 1
+        raise PasswordPoolBusy()
+    enviat = time.monotonic()
+
+    def job():
+        inici = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            _record(inici - enviat, time.monotonic() - inici)
+
+    try:
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(job)
+        return job()
+    finally:
+        pendents.release()
+
+
+def hash_password(password):
+    """Devuelve el hash bcrypt (str) de una contraseña en texto."""
+    return _run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(ROUNDS)).decode('utf-8')
+
+
+def check_password(password, hashed):
+    """Comprueba una contraseña en texto contra su hash bcrypt guardado."""
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    return _run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+
+def password_stats():
+    with _lock:
+        stats = dict(_stats)
+    operacions = stats['operacions']
+    stats['temps_hash_mitja'] = stats['temps_hash'] / operacions if operacions else 0.0
+    stats['temps_espera_mitja'] = stats['temps_espera'] / operacions if operacions else 0.0
+    stats['rounds'] = ROUNDS
+    stats['max_pendents'] = MAX_PENDENTS
+    return stats
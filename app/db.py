@@ -0,0 +1,240 @@
+import time  # Importa time para medir esperas y tiempos de inactividad
+import threading  # Con eventlet.monkey_patch() estos primitivos pasan a ser "verdes"
+import queue  # Cola de conexiones libres (también parcheada por eventlet)
+from contextlib import contextmanager  # Para exponer la conexión como gestor de contexto
+import mysql.connector  # Importa el conector de MySQL
+from mysql.connector import errors  # Errores del conector (PoolError, etc.)
+
+
+# Funciones a las que se pasa cada conexión nueva (p. ej. la instrumentación de consultas)
+connect_listeners = []
+
+
+class PoolTimeout(errors.PoolError):
+    """Se lanza cuando no hay conexiones libres dentro del tiempo de espera."""
+
+
+class ConnectionPool:
+    """Pool de conexiones MySQL acotado (size + max_overflow).
+
+    Las conexiones libres se guardan en una pila LIFO para reutilizar siempre
+    las más recientes. Como run.py aplica eventlet.monkey_patch() antes de
+    importar la app, threading y queue ceden el hub mientras se espera.
+    """
+
+    def __init__(self, connect_args, size=5, max_overflow=10, timeout=10,
+                 recycle=3600, pre_ping=True):
+        self.connect_args = connect_args  # Argumentos para mysql.connector.connect
+        self.size = size  # Conexiones que se mantienen abiertas
+        self.max_overflow = max_overflow  # Conexiones extra temporales
+        self.timeout = timeout  # Segundos máximos esperando una conexión
+        self.recycle = recycle  # Segundos de inactividad antes de reciclar
+        self.pre_ping = pre_ping  # Comprueba la conexión antes de entregarla
+
+        self._idle = queue.LifoQueue()  # Conexiones libres: (cnx, ultimo_uso)
+        self._lock = threading.Lock()
+        self._open = 0  # Conexiones abiertas (libres + en uso)
+        self._stats = {
+            'checkouts': 0,  # Conexiones entregadas
+            'created': 0,  # Conexiones nuevas abiertas
+            'recycled': 0,  # Conexiones cerradas por inactividad o ping fallido
+            'timeouts': 0,  # Esperas que han superado el timeout
+            'wait_time': 0.0,  # Tiempo total esperando una conexión
+        }
+
+    def _connect(self):
+        cnx = mysql.connector.connect(**self.connect_args)
+        for listener in connect_listeners:
+            listener(cnx)
+        with self._lock:
+            self._stats['created'] += 1
+        return cnx
+
+    def _discard(self, cnx):
+        # Cierra la conexión y libera su hueco en el pool
+        try:
+            cnx.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    def _reserve_slot(self):
+        # Reserva un hueco para una conexión nueva si no se ha llegado al límite
+        with self._lock:
+            if self._open < self.size + self.max_overflow:
+                self._open += 1
+                return True
+            return False
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            try:
+                cnx, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve_slot():
+                    try:
+                        cnx = self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._open -= 1
+                        raise
+                    break
+                # Pool lleno: espera a que otra petición devuelva una conexión
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeout(msg='No hi ha connexions lliures a la base de dades')
+                try:
+                    cnx, last_used = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            # Recicla conexiones inactivas demasiado tiempo o caídas
+            if self.recycle and time.monotonic() - last_used > self.recycle:
+                self._recycle(cnx)
+                continue
+            if self.pre_ping and not self._ping(cnx):
+                self._recycle(cnx)
+                continue
+            break
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time'] += time.monotonic() - start
+        return cnx
+
+    def _recycle(self, cnx):
+        self._discard(cnx)
+        with self._lock:
+            self._stats['recycled'] += 1
+
+    def _ping(self, cnx):
+        try:
+            cnx.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def release(self, cnx):
+        try:
+            # Cierra cualquier transacción abierta para no servir datos obsoletos
+            cnx.rollback()
+        except Exception:
+            self._discard(cnx)
+            return
+        if self._idle.qsize() >= self.size:
+            # Conexión de overflow: se cierra en lugar de guardarla
+            self._discard(cnx)
+        else:
+            self._idle.put((cnx, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        cnx = self.acquire()
+        try:
+            yield cnx
+        finally:
+            self.release(cnx)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            open_connections = self._open
+        idle = self._idle.qsize()
+        stats.update({
+            'size': self.size,
+            'max_overflow': self.max_overflow,
+            'open': open_connections,
+            'idle': idle,
+            'in_use': open_connections - idle,
+        })
+        return stats
+
+    def close(self):
+        # Cierra todas las conexiones libres (las que están en uso se cierran al devolverse)
+        while True:
+            try:
+                cnx, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(cnx)
+
+
+_pool = None  # Pool global de la aplicación
+_pool_lock = threading.Lock()
+
+
+def init_pool(config):
+    """Crea el pool global a partir de la configuración (dict o app.config)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(
+            connect_args={
+                'host': config['MYSQL_HOST'],
+                'port': config.get('MYSQL_PORT', 3306),
+                'user': config['MYSQL_USER'],
+                'password': config['MYSQL_PASSWORD'],
+                'database': config['MYSQL_DB'],
+            },
+            size=config.get('MYSQL_POOL_SIZE', 5),
+            max_overflow=config.get('MYSQL_POOL_MAX_OVERFLOW', 10),
+            timeout=config.get('MYSQL_POOL_TIMEOUT', 10),
+            recycle=config.get('MYSQL_POOL_RECYCLE', 3600),
+            pre_ping=config.get('MYSQL_POOL_PRE_PING', True),
+        )
+    return _pool
+
+
+def get_pool():
+    # Si nadie ha llamado a init_pool (p. ej. scripts de importación), usa Config
+    if _pool is None:
+        from app.config import Config
+        init_pool({key: getattr(Config, key) for key in dir(Config) if key.isupper()})
+    return _pool
+
+
+def db_connection():
+    """Gestor de contexto que presta una conexión del pool y la devuelve al salir."""
+    return get_pool().connection()
+
+
+class LazyConnection:
+    """Conexión que solo se pide al pool la primera vez que se usa.
+
+    Sirve para handlers que casi siempre se resuelven desde caché y no deben
+    ocupar (ni hacer ping a) una conexión si no la necesitan.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._cnx = None
+
+    def __getattr__(self, name):
+        if self._cnx is None:
+            self._cnx = self._pool.acquire()
+        return getattr(self._cnx, name)
+
+    def _release(self):
+        if self._cnx is not None:
+            self._pool.release(self._cnx)
+            self._cnx = None
+
+
+@contextmanager
+def lazy_db_connection():
+    """Como db_connection(), pero sin tocar el pool hasta la primera consulta."""
+    cnx = LazyConnection(get_pool())
+    try:
+        yield cnx
+    finally:
+        cnx._release()
+
+
+def pool_stats():
+    return get_pool().stats()
@@ -0,0 +1,141 @@
+import csv  # Exportación CSV fila a fila
+import io
+import re  # Para leer las líneas de las listas
+from app.cataleg import normalize_name  # Misma normalización que el catálogo local
+
+MIDA_LOT_DECKLIST = 500  # Líneas que se resuelven contra el catálogo de cada vez
+MAX_QUANTITAT_LINIA = 1000  # Copias máximas de una carta en una línea
+MAX_DESCARTADES = 100  # Líneas descartadas que se devuelven con detalle (el resto solo se cuentan)
+
+# Secciones de los formatos de MTGO/Arena: no son cartas
+SECCIONS = {'deck', 'sideboard', 'commander', 'companion', 'maybeboard', 'mainboard', 'main', 'side'}
+
+# "4 Lightning Bolt", "4x Lightning Bolt", "SB: 2 Duress"
+_LINIA = re.compile(r'^(?:SB:\s*)?(\d+)\s*[xX]?\s+(.+)$')
+# Sufijo de Arena/MTGO: "(M10) 146", "[M10]", "*F*"
+_EXPANSIO = re.compile(r'\s+[(\[]([A-Za-z0-9]{2,8})[)\]](?:\s+\S+)?$')
+_FOIL = re.compile(r'\s+\*[A-Za-z]+\*$')
+
+
+def parse_line(linia):
+    """Interpreta una línea de una lista de cartas.
+
+    Devuelve (quantitat, nom, expansio) o None si la línea no es una carta
+    (vacía, comentario o cabecera de sección). ValueError si la cantidad no es válida.
+    """
+    linia = linia.strip().lstrip('﻿')
+    if not linia or linia.startswith(('//', '#')) or linia.lower().rstrip(':') in SECCIONS:
+        return None
+    coincidencia = _LINIA.match(linia)
+    if coincidencia:
+        quantitat, nom = int(coincidencia.group(1)), coincidencia.group(2)
+    else:
+        quantitat, nom = 1, linia  # Sin cantidad: una copia
+    if quantitat < 1 or quantitat > MAX_QUANTITAT_LINIA:
+        raise ValueError('quantitat no vàlida')
+    nom = _FOIL.sub('', nom)
+    expansio = None
+    coincidencia = _EXPANSIO.search(nom)
+    if coincidencia:
+        expansio = coincidencia.group(1).upper()
+        nom = nom[:coincidencia.start()]
+    return quantitat, nom.strip(), expansio
+
+
+def resolve_names(cursor, entrades):
+    """Devuelve {(nom_normalitzat, expansio): id_carta} para un lote de entradas.
+
+    Una sola consulta por lote contra el catálogo local. Si la expansión no
+    coincide con ninguna impresión se usa la de menor id.
+    """
+    claus = list(dict.fromkeys(normalize_name(nom) for _, nom, _ in entrades))
+    if not claus:
+        return {}
+    marcadors = ', '.join(['%s'] * len(claus))
+    cursor.execute(f"""
+        SELECT nom_normalitzat, expansio, id_carta FROM cartes
+        WHERE nom_normalitzat IN ({marcadors})
+        ORDER BY id_carta
+    """, claus)
+    per_nom, per_expansio = {}, {}
+    for clau, expansio, id_carta in cursor.fetchall():
+        per_nom.setdefault(clau, id_carta)
+        if expansio:
+            per_expansio.setdefault((clau, expansio.upper()), id_carta)
+    resoltes = {}
+    for _, nom, expansio in entrades:
+        clau = normalize_name(nom)
+        id_carta = per_expansio.get((clau, expansio)) or per_nom.get(clau)
+        if id_carta is not None:
+            resoltes[(clau, expansio)] = id_carta
+    return resoltes
+
+
+def import_lines(cursor, id_col, linies, upsert):
+    """Añade a la colección las cartas de un iterable de líneas, por lotes.
+
+    No hace commit. Solo se guarda en memoria un lote de líneas y, de las
+    descartadas, las primeras MAX_DESCARTADES. Devuelve el resumen.
+    """
+    resum = {'linies': 0, 'copies': 0, 'descartades': [], 'total_descartades': 0}
+
+    def descarta(numero, text, motiu):
+        resum['total_descartades'] += 1
+        if len(resum['descartades']) < MAX_DESCARTADES:
+            resum['descartades'].append({'linia': numero, 'text': text.strip()[:200], 'motiu': motiu})
+
+    def processa(lot):
+        resoltes = resolve_names(cursor, [entrada for _, _, entrada in lot])
+        quantitats = {}
+        for numero, text, (quantitat, nom, expansio) in lot:
+            id_carta = resoltes.get((normalize_name(nom), expansio))
+            if id_carta is None:
+                descarta(numero, text, 'no_trobada')
+                continue
+            quantitats[id_carta] = quantitats.get(id_carta, 0) + quantitat
+            resum['copies'] += quantitat
+        if quantitats:
+            cursor.executemany(upsert, [(id_col, id_carta, quantitat) for id_carta, quantitat in quantitats.items()])
+
+    lot = []
+    for numero, text in enumerate(linies, start=1):
+        resum['linies'] = numero
+        try:
+            entrada = parse_line(text)
+        except ValueError:
+            descarta(numero, text, 'no_valida')
+            continue
+        if entrada is None:
+            continue
+        lot.append((numero, text, entrada))
+        if len(lot) >= MIDA_LOT_DECKLIST:
+            processa(lot)
+            lot = []
+    if lot:
+        processa(lot)
+    resum['descartades'].sort(key=lambda d: d['linia'])
+    return resum
+
+
+def export_text(files):
+    """Líneas "4 Lightning Bolt (M10)" de las filas de una colección."""
+    for fila in files:
+        expansio = f" ({fila['expansio']})" if fila['expansio'] else ''
+        yield f"{fila['quantitat']} {fila['nom']}{expansio}\n".encode('utf-8')
+
+
+def export_csv(files):
+    """CSV con cabecera (quantitat, nom, expansio, id_carta), una fila de cada vez."""
+    buffer = io.StringIO()
+    escriptor = csv.writer(buffer)
+
+    def linia(valors):
+        escriptor.writerow(valors)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text.encode('utf-8')
+
+    yield linia(('quantitat', 'nom', 'expansio', 'id_carta'))
+    for fila in files:
+        yield linia((fila['quantitat'], fila['nom'], fila['expansio'] or '', fila['id_carta']))
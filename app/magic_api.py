@@ -1,98 +1,319 @@
-from mtgsdk import Card  # Importa la clase Card de la biblioteca mtgsdk para interactuar con la API de cartas
-from routes import databaseconnection  # Importa la función para establecer la conexión a la base de datos
-import mysql.connector  # Importa el conector de MySQL
-from time import sleep  # Importa la función sleep para pausar la ejecución
+import argparse  # Para los argumentos de la línea de comandos
+import json  # Para mostrar el progreso en formato JSON
+import queue  # Cola acotada entre los descargadores y el escritor
+import threading  # Hilos para descargar páginas en paralelo
 import time  # Importa el módulo time para manejar el tiempo
 from datetime import timedelta  # Importa timedelta para calcular intervalos de tiempo
+from mtgsdk import Card  # Importa la clase Card de la biblioteca mtgsdk para interactuar con la API de cartas
+import mysql.connector  # Importa el conector de MySQL
+from app.db import db_connection  # Importa el pool de conexiones a la base de datos
+from app.cataleg import upsert_cards, normalize_name  # Catálogo local de cartas
+
+IMPORTACIO = 'cartes'  # Nombre del punto de control en la tabla importacio_estat
+MIDA_PAGINA = 100  # Cartas por página de la API (máximo que permite)
+MIDA_LOT = 500  # Cartas por lote insertado en la base de datos
+CONCURRENCIA = 4  # Descargadores de páginas en paralelo
+REINTENTS = 5  # Reintentos por página antes de abandonar
+ESPERA_REINTENT = 1.0  # Segundos de espera del primer reintento (se dobla en cada uno)
+PETICIONS_PER_SEGON = 0  # Límite de peticiones a la API (0 = sin límite)
+
+
+def fetch_page(page, page_size=MIDA_PAGINA):
+    """Descarga una página de cartas de la API remota."""
+    return Card.where(page=page, pageSize=page_size).all()
+
+
+class RateLimiter:
+    """Limita las peticiones por segundo compartidas entre varios hilos."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)  # Próximo hueco libre
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def fetch_page_with_retry(page, page_size=MIDA_PAGINA, limiter=None, retries=REINTENTS, backoff=ESPERA_REINTENT):
+    """Descarga una página reintentando con espera exponencial si la API falla."""
+    for attempt in range(retries + 1):
+        if limiter:
+            limiter.wait()
+        try:
+            return fetch_page(page, page_size)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def load_checkpoint(cnx, nom=IMPORTACIO):
+    """Devuelve (ultima_pagina, cartes_desades) del punto de control, o (0, 0) si no existe."""
+    with cnx.cursor(dictionary=True) as cursor:
+        cursor.execute("SELECT ultima_pagina, cartes_desades FROM importacio_estat WHERE nom = %s", (nom,))
+        fila = cursor.fetchone()
+    if not fila:
+        return 0, 0
+    return fila['ultima_pagina'], fila['cartes_desades']
+
+
+def save_checkpoint(cursor, page, total, nom=IMPORTACIO):
+    cursor.execute("""
+        INSERT INTO importacio_estat (nom, ultima_pagina, cartes_desades)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE ultima_pagina = VALUES(ultima_pagina),
+                                cartes_desades = VALUES(cartes_desades)
+    """, (nom, page, total))
+
+
+def reset_checkpoint(cnx, nom=IMPORTACIO):
+    with cnx.cursor() as cursor:
+        cursor.execute("DELETE FROM importacio_estat WHERE nom = %s", (nom,))
+    cnx.commit()
+
+
+def insert_cards_batch(cnx, batch, last_page, total):
+    """Guarda un lote de cartas y el punto de control en una única transacción."""
+    with cnx.cursor() as cursor:
+        inserted = upsert_cards(cursor, batch)
+        save_checkpoint(cursor, last_page, total + inserted)
+    cnx.commit()  # Un solo commit por lote
+    return inserted
+
+
+def renormalize_names(batch_size=MIDA_LOT):
+    """Recalcula nom_normalitzat de todo el catálogo con normalize_name.
+
+    La migración 003 solo puede aproximarlo en SQL (LOWER/TRIM); esta pasada
+    quita acentos, convierte æ y junta espacios igual que la búsqueda.
+    Recorre la tabla por id y solo actualiza las filas que cambian. Devuelve cuántas.
+    """
+    actualitzades = 0
+    ultim = 0
+    with db_connection() as cnx:
+        while True:
+            with cnx.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id_carta, nom, nom_normalitzat FROM cartes
+                    WHERE id_carta > %s AND nom IS NOT NULL
+                    ORDER BY id_carta
+                    LIMIT %s
+                """, (ultim, batch_size))
+                files = cursor.fetchall()
+                if not files:
+                    break
+                ultim = files[-1][0]
+                canvis = [(normalize_name(nom), id_carta) for id_carta, nom, actual in files
+                          if normalize_name(nom) != actual]
+                if canvis:
+                    cursor.executemany("UPDATE cartes SET nom_normalitzat = %s WHERE id_carta = %s", canvis)
+            cnx.commit()  # Un commit por lote
+            actualitzades += len(canvis)
+    return actualitzades
+
 
-def insert_cards_batch(batch):
-    cnx = None  # Inicializa la variable de conexión
-    try:
-        cnx = databaseconnection()  # Establece la conexión a la base de datos
-        if cnx and cnx.is_connected():  # Verifica si la conexión es válida
-            with cnx.cursor(dictionary=True) as cursor:  # Usa un cursor que devuelve diccionarios
-                cont = 0  # Contador de cartas insertadas
-                # Preparamos los datos asegurando que todos los campos sean strings
-                for card in batch:
-                    if card.multiverse_id is not None:  # Verifica que la carta tenga un ID
-                        carta = card.multiverse_id
-                        print(f"\nInsertando carta: {card.name}")  # Muestra el nombre de la carta que se está insertando
-                        print(type(carta))  # Muestra el tipo de la carta
-                        cont += 1  # Incrementa el contador
-                        # Inserta la carta en la base de datos
-                        cursor.execute("INSERT INTO cartes(id_carta) VALUES (%s)", (carta,))
-                        cnx.commit()  # Confirma los cambios en la base de datos
-                # Devuelve el número de cartas insertadas
-                return cont
-    except mysql.connector.Error as err:
-        print(f"\nError en el batch: {err}")  # Muestra el error si ocurre
-        print(f"Última carta procesada: {batch[-1].name if batch else 'N/A'}")  # Muestra la última carta procesada
-        return 0  # Retorna 0 en caso de error
-    finally:
-        if cnx and cnx.is_connected():
-            cnx.close()  # Cierra la conexión a la base de datos
-
-def process_all_cards():
-    batch_size = 500  # Tamaño del lote para insertar cartas
-    current_batch = []  # Inicializa el lote actual
-    total_inserted = 0  # Contador total de cartas insertadas
+def print_progress(progress):
+    # Una línea por lote con el estado de la importación
+    print(f"Pàgina {progress['pagina']} | "
+          f"Cartes desades: {progress['cartes_desades']} | "
+          f"Temps: {timedelta(seconds=int(progress['temps']))} | "
+          f"Velocitat: {progress['cartes_per_segon']:.2f} cartes/segon", flush=True)
+
+
+def print_progress_json(progress):
+    print(json.dumps(progress), flush=True)
+
+
+def _progress(start_time, page, total, initial_total, finished=False):
+    elapsed = time.time() - start_time
+    saved = total - initial_total
+    return {
+        'pagina': page,
+        'cartes_desades': total,
+        'cartes_aquesta_execucio': saved,
+        'temps': round(elapsed, 2),
+        'cartes_per_segon': saved / elapsed if elapsed > 0 else 0,
+        'completat': finished,
+    }
+
+
+def process_all_cards(batch_size=MIDA_LOT, page_size=MIDA_PAGINA, restart=False, on_progress=print_progress):
+    """Importa todo el catálogo de la API, reanudando desde el último punto de control.
+
+    on_progress recibe un diccionario con el progreso después de cada lote.
+    Devuelve el mismo diccionario con el estado final.
+    """
     start_time = time.time()  # Registra el tiempo de inicio
-    
-    try:
-        print("Iniciando proceso de carga de cartas...")
-        print(f"Hora de inicio: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        # Obtenemos el iterador de cartas
-        all_cards = Card.all()
-        
-        for i, card in enumerate(all_cards, 1):  # Itera sobre todas las cartas
-            try:
-                if card.multiverse_id is not None:  # Verifica que la carta tenga un ID
-                    current_batch.append(card)  # Agrega la carta al lote actual
-                    
-                    # Procesamos el lote cuando alcanza el tamaño
-                    if len(current_batch) >= batch_size:
-                        inserted = insert_cards_batch(current_batch)  # Inserta el lote en la base de datos
-                        total_inserted += inserted  # Actualiza el total de cartas insertadas
-                        current_batch = []  # Reinicia el lote actual
-                        
-                        # Muestra progreso
-                        elapsed = time.time() - start_time  # Calcula el tiempo transcurrido
-                        avg_speed = total_inserted / elapsed if elapsed > 0 else 0  # Calcula la velocidad promedio
-                        print(f"\nProgreso: {total_inserted} cartas insertadas | "
-                              f"Tiempo: {timedelta(seconds=int(elapsed))} | "
-                              f"Velocidad: {avg_speed:.2f} cartas/segundo")
-                        
-                        # Pausa para evitar sobrecarga
-                        sleep(1.5)  # Pausa de 1.5 segundos
-            
-                # Mostrar progreso cada 100 cartas
-                if i % 100 == 0:
-                    elapsed = time.time() - start_time  # Calcula el tiempo transcurrido
-                    print(f"\rCartas procesadas: {i} | Tiempo: {timedelta(seconds=int(elapsed))}", end='', flush=True)
-            
-            except Exception as card_error:
-                print(f"\nError procesando carta {i}: {card_error}")  # Muestra el error si ocurre
-                continue  # Continúa con la siguiente carta
-        
-        # Procesar el último lote incom pleto
-        if current_batch:
-            inserted = insert_cards_batch(current_batch)  # Inserta el último lote en la base de datos
-            total_inserted += inserted  # Actualiza el total de cartas insertadas
-        
-    except Exception as e:
-        print(f"\nError general: {e}")  # Muestra el error general si ocurre
-    finally:
-        end_time = time.time()  # Registra el tiempo de finalización
-        total_time = end_time - start_time  # Calcula el tiempo total
-        print("\n" + "="*50)
-        print("PROCESO COMPLETADO")  # Indica que el proceso ha finalizado
-        print(f"Hora de finalización: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Tiempo total: {timedelta(seconds=int(total_time))}")  # Muestra el tiempo total transcurrido
-        print(f"Cartas insertadas: {total_inserted}")  # Muestra el total de cartas insertadas
-        if total_inserted > 0:
-            print(f"Velocidad promedio: {total_inserted/total_time:.2f} cartas/segundo")  # Muestra la velocidad promedio
-        print("="*50)
+
+    with db_connection() as cnx:
+        if restart:
+            reset_checkpoint(cnx)
+        last_page, total = load_checkpoint(cnx)
+        initial_total = total
+
+        page = last_page
+        current_batch = []  # Inicializa el lote actual
+        while True:
+            page += 1
+            cards = fetch_page_with_retry(page, page_size)
+            if cards:
+                current_batch.extend(cards)
+            # Guarda el lote al llenarse o al llegar a la última página
+            if current_batch and (len(current_batch) >= batch_size or not cards):
+                try:
+                    total += insert_cards_batch(cnx, current_batch, page if cards else page - 1, total)
+                except mysql.connector.Error:
+                    cnx.rollback()
+                    raise
+                current_batch = []
+                on_progress(_progress(start_time, page if cards else page - 1, total, initial_total))
+            if not cards:
+                break
+
+    result = _progress(start_time, page - 1, total, initial_total, finished=True)
+    on_progress(result)
+    return result
+
+
+def process_all_cards_parallel(concurrency=CONCURRENCIA, batch_size=MIDA_LOT, page_size=MIDA_PAGINA,
+                               restart=False, retries=REINTENTS, backoff=ESPERA_REINTENT,
+                               rate=PETICIONS_PER_SEGON, on_progress=print_progress):
+    """Importa el catálogo con varios descargadores y un único escritor.
+
+    Los descargadores piden páginas consecutivas y las dejan en una cola
+    acotada; el escritor (este hilo) las guarda por lotes. Como las páginas
+    llegan desordenadas, el punto de control solo avanza hasta la página más
+    alta con todas las anteriores ya guardadas.
+    """
+    start_time = time.time()
+    limiter = RateLimiter(rate)
+    pages = queue.Queue(maxsize=concurrency * 2)  # Acota la memoria si la base de datos va lenta
+    lock = threading.Lock()
+    state = {'next_page': 0, 'end_page': None, 'error': None}
+    stop = threading.Event()
+
+    def fetcher():
+        try:
+            while not stop.is_set():
+                with lock:
+                    page = state['next_page']
+                    if state['end_page'] is not None and page >= state['end_page']:
+                        return
+                    state['next_page'] += 1
+                try:
+                    cards = fetch_page_with_retry(page, page_size, limiter, retries, backoff)
+                except Exception as err:
+                    with lock:
+                        state['error'] = err
+                    stop.set()
+                    return
+                if not cards:
+                    # Primera página vacía: no hay más cartas a partir de aquí
+                    with lock:
+                        if state['end_page'] is None or page < state['end_page']:
+                            state['end_page'] = page
+                    return
+                pages.put((page, cards))
+        finally:
+            pages.put(None)  # Avisa al escritor de que este descargador ha terminado
+
+    with db_connection() as cnx:
+        if restart:
+            reset_checkpoint(cnx)
+        last_page, total = load_checkpoint(cnx)
+        initial_total = total
+        state['next_page'] = last_page + 1
+        watermark = last_page  # Última página con todas las anteriores guardadas
+        written = set()  # Páginas guardadas por encima de watermark
+
+        workers = [threading.Thread(target=fetcher, daemon=True) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+
+        running = len(workers)
+        current_batch, batch_pages = [], []
+        try:
+            while running:
+                item = pages.get()
+                if item is None:
+                    running -= 1
+                else:
+                    page, cards = item
+                    current_batch.extend(cards)
+                    batch_pages.append(page)
+                if current_batch and (len(current_batch) >= batch_size or not running):
+                    written.update(batch_pages)
+                    while watermark + 1 in written:
+                        watermark += 1
+                        written.discard(watermark)
+                    total += insert_cards_batch(cnx, current_batch, watermark, total)
+                    current_batch, batch_pages = [], []
+                    on_progress(_progress(start_time, watermark, total, initial_total))
+        except Exception:
+            stop.set()
+            cnx.rollback()
+            # Vacía la cola para que ningún descargador se quede bloqueado
+            while any(worker.is_alive() for worker in workers):
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise
+
+    if state['error'] is not None:
+        raise state['error']
+
+    result = _progress(start_time, watermark, total, initial_total, finished=True)
+    on_progress(result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importa el catàleg de cartes de MTG a la base de dades')
+    parser.add_argument('--mida-lot', type=int, default=MIDA_LOT, help='cartes per lot inserit')
+    parser.add_argument('--mida-pagina', type=int, default=MIDA_PAGINA, help='cartes per pàgina de l\'API')
+    parser.add_argument('--reinicia', action='store_true', help='ignora el punt de control i comença de zero')
+    parser.add_argument('--json', action='store_true', help='mostra el progrés en format JSON')
+    parser.add_argument('--concurrencia', type=int, default=CONCURRENCIA,
+                        help='pàgines descarregades en paral·lel (1 = seqüencial)')
+    parser.add_argument('--reintents', type=int, default=REINTENTS, help='reintents per pàgina')
+    parser.add_argument('--peticions-per-segon', type=float, default=PETICIONS_PER_SEGON,
+                        help='límit de peticions a l\'API (0 = sense límit)')
+    parser.add_argument('--normalitza', action='store_true',
+                        help='només recalcula nom_normalitzat de les cartes guardades (després de sql/003)')
+    args = parser.parse_args(argv)
+
+    if args.normalitza:
+        print(f"Noms normalitzats actualitzats: {renormalize_names(args.mida_lot)}", flush=True)
+        return
+
+    on_progress = print_progress_json if args.json else print_progress
+    if args.concurrencia > 1:
+        process_all_cards_parallel(
+            concurrency=args.concurrencia,
+            batch_size=args.mida_lot,
+            page_size=args.mida_pagina,
+            restart=args.reinicia,
+            retries=args.reintents,
+            rate=args.peticions_per_segon,
+            on_progress=on_progress,
+        )
+    else:
+        process_all_cards(
+            batch_size=args.mida_lot,
+            page_size=args.mida_pagina,
+            restart=args.reinicia,
+            on_progress=on_progress,
+        )
+
 
 if __name__ == "__main__":
-    process_all_cards()  # Llama a la función principal para iniciar el proceso de carga de cartas
\ No newline at end of file
+    main()  # Llama a la función principal para iniciar el proceso de carga de cartas
@@ -0,0 +1,256 @@
+import time  # Para medir latencias con perf_counter
+import threading  # Con eventlet.monkey_patch() threading.local es local a cada greenlet
+from functools import wraps
+from flask import Response, request
+
+# Límites de los histogramas de latencia (segundos), los mismos que usa Prometheus por defecto
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Límites del histograma de consultas a la base de datos por petición
+BUCKETS_CONSULTES = (0, 1, 2, 5, 10, 20, 50, 100)
+
+PREFIX = 'latrobada'
+
+enabled = False  # Sin activar no se instala ningún gancho: coste cero
+_local = threading.local()  # Consultas y tiempo de BD de la petición o evento en curso
+
+
+def _escape(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(noms, valors, extra=()):
+    parelles = [f'{nom}="{_escape(valor)}"' for nom, valor in zip(noms, valors)]
+    parelles.extend(f'{nom}="{_escape(valor)}"' for nom, valor in extra)
+    return '{' + ','.join(parelles) + '}' if parelles else ''
+
+
+def _numero(valor):
+    return repr(float(valor)) if not isinstance(valor, int) else str(valor)
+
+
+class Histogram:
+    """Histograma acumulado (buckets, suma y recuento) con etiquetas."""
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS_LATENCIA):
+        self.name = f'{PREFIX}_{name}'
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # etiquetas -> [recuentos por bucket..., suma, total]
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, valor, *valors):
+        with self._lock:
+            fila = self._values.get(valors)
+            if fila is None:
+                fila = self._values[valors] = [0] * len(self.buckets) + [0.0, 0]
+            for i, limit in enumerate(self.buckets):
+                if valor <= limit:
+                    fila[i] += 1
+            fila[-2] += valor
+            fila[-1] += 1
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            values = [(valors, list(fila)) for valors, fila in self._values.items()]
+        for valors, fila in values:
+            for limit, recompte in zip(self.buckets, fila):
+                yield f'{self.name}_bucket{_labels(self.labels, valors, [("le", _numero(limit))])} {recompte}'
+            yield f'{self.name}_bucket{_labels(self.labels, valors, [("le", "+Inf")])} {fila[-1]}'
+            yield f'{self.name}_sum{_labels(self.labels, valors)} {_numero(fila[-2])}'
+            yield f'{self.name}_count{_labels(self.labels, valors)} {fila[-1]}'
+
+
+registry = []  # Métricas propias, en el orden en que se exponen
+
+http_latencia = Histogram('http_request_seconds', 'Latencia de las peticiones HTTP por ruta',
+                          ('method', 'route', 'status'))
+socket_latencia = Histogram('socketio_event_seconds', 'Latencia de los eventos Socket.IO', ('event',))
+handler_consultes = Histogram('handler_db_queries', 'Consultas a MySQL por petición o evento',
+                              ('tipus', 'handler'), buckets=BUCKETS_CONSULTES)
+handler_temps_db = Histogram('handler_db_seconds', 'Tiempo en MySQL por petición o evento',
+                             ('tipus', 'handler'))
+db_consultes = Histogram('db_query_seconds', 'Duración de cada consulta a MySQL')
+mtgsdk_peticions = Histogram('mtgsdk_request_seconds', 'Peticiones HTTP a la API de mtgsdk', ('result',))
+
+
+# --- Ámbito de petición / evento --------------------------------------------
+
+def _begin():
+    _local.consultes = 0
+    _local.temps_db = 0.0
+    _local.inici = time.perf_counter()
+
+
+def _end(tipus, handler):
+    # Devuelve la duración y registra las consultas a la BD del ámbito que termina
+    durada = time.perf_counter() - getattr(_local, 'inici', time.perf_counter())
+    consultes = getattr(_local, 'consultes', None)
+    if consultes is not None:
+        handler_consultes.observe(consultes, tipus, handler)
+        handler_temps_db.observe(_local.temps_db, tipus, handler)
+        _local.consultes = None
+    return durada
+
+
+def _route():
+    # Se usa la plantilla de la ruta (no la URL) para no disparar el número de series
+    return request.url_rule.rule if request.url_rule is not None else 'sense_ruta'
+
+
+def _before_request():
+    _begin()
+
+
+def _after_request(response):
+    ruta = _route()
+    durada = _end('http', ruta)
+    http_latencia.observe(durada, request.method, ruta, response.status_code)
+    return response
+
+
+def _timed_event(event, handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        _begin()
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            socket_latencia.observe(_end('socketio', event), event)
+    return wrapper
+
+
+# --- Ganchos en MySQL y mtgsdk ----------------------------------------------
+
+def record_query(durada):
+    db_consultes.observe(durada)
+    if getattr(_local, 'consultes', None) is not None:
+        _local.consultes += 1
+        _local.temps_db += durada
+
+
+def _instrument_connection(cnx):
+    # Todos los cursores (también executemany) pasan por cmd_query
+    original = cnx.cmd_query
+
+    @wraps(original)
+    def cmd_query(*args, **kwargs):
+        inici = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            record_query(time.perf_counter() - inici)
+
+    cnx.cmd_query = cmd_query
+
+
+def _instrument_mtgsdk():
+    # Card.where(...).all() hace una petición por página a través de RestClient.get
+    from mtgsdk.restclient import RestClient
+    original = RestClient.get
+
+    @wraps(original)
+    def get(url, params={}):
+        inici = time.perf_counter()
+        resultat = 'error'
+        try:
+            resposta = original(url, params)
+            resultat = 'ok'
+            return resposta
+        finally:
+            mtgsdk_peticions.observe(time.perf_counter() - inici, resultat)
+
+    RestClient.get = staticmethod(get)
+
+
+def _instrument_socketio(socketio):
+    for handlers in socketio.server.handlers.values():
+        for event, handler in list(handlers.items()):
+            handlers[event] = _timed_event(event, handler)
+
+
+# --- Métricas calculadas al leer /metrics -----------------------------------
+
+def _gauge(nom, help, valors, tipus='gauge'):
+    # valors: [(etiquetas, valor)]
+    nom = f'{PREFIX}_{nom}'
+    yield f'# HELP {nom} {help}'
+    yield f'# TYPE {nom} {tipus}'
+    for etiquetes, valor in valors:
+        yield f'{nom}{_labels([k for k, _ in etiquetes], [v for _, v in etiquetes])} {_numero(valor)}'
+
+
+def _collect_state(socketio):
+    from app.db import pool_stats
+    from app.cache import cache_stats
+    from app.contrasenyes import password_stats
+    from app.xat import message_writer
+
+    pool = pool_stats()
+    yield from _gauge('db_pool_connections', 'Conexiones del pool por estado',
+                      [((('state', estat),), pool[estat]) for estat in ('open', 'idle', 'in_use')])
+    yield from _gauge('db_pool_checkouts_total', 'Conexiones entregadas por el pool', [((), pool['checkouts'])], 'counter')
+    yield from _gauge('db_pool_wait_seconds_total', 'Tiempo total esperando una conexión libre', [((), pool['wait_time'])], 'counter')
+    yield from _gauge('db_pool_timeouts_total', 'Esperas de conexión que han superado el timeout', [((), pool['timeouts'])], 'counter')
+    yield from _gauge('db_pool_created_total', 'Conexiones nuevas abiertas', [((), pool['created'])], 'counter')
+    yield from _gauge('db_pool_recycled_total', 'Conexiones cerradas por inactividad o ping fallido', [((), pool['recycled'])], 'counter')
+
+    caches = cache_stats()
+    for clau, help, tipus in (('hits', 'Aciertos de la caché', 'counter'),
+                              ('misses', 'Fallos de la caché', 'counter'),
+                              ('evictions', 'Entradas expulsadas de la caché', 'counter'),
+                              ('hit_ratio', 'Proporción de aciertos de la caché', 'gauge'),
+                              ('size', 'Entradas guardadas en la caché', 'gauge')):
+        nom = f'cache_{clau}_total' if tipus == 'counter' else f'cache_{clau}'
+        yield from _gauge(nom, help, [((('cache', cache),), stats[clau]) for cache, stats in caches.items()], tipus)
+
+    # Sockets y salas de este proceso (con varios workers, cada uno expone los suyos)
+    connexions, sales = 0, 0
+    for rooms in socketio.server.manager.rooms.values():
+        sids = rooms.get(None, {})
+        connexions += len(sids)
+        sales += sum(1 for room in rooms if room is not None and room not in sids)
+    yield from _gauge('socketio_connections', 'Sockets conectados a este proceso', [((), connexions)])
+    yield from _gauge('socketio_rooms', 'Salas de conversación activas en este proceso', [((), sales)])
+
+    contrasenyes = password_stats()
+    yield from _gauge('bcrypt_operations_total', 'Hashes y verificaciones de bcrypt', [((), contrasenyes['operacions'])], 'counter')
+    yield from _gauge('bcrypt_rejected_total', 'Operaciones de bcrypt rechazadas por cola llena', [((), contrasenyes['rebutjades'])], 'counter')
+    yield from _gauge('bcrypt_wait_seconds_total', 'Tiempo total esperando un hilo de bcrypt', [((), contrasenyes['temps_espera'])], 'counter')
+
+    xat = message_writer.stats()
+    yield from _gauge('chat_pending_messages', 'Mensajes del chat pendientes de guardar', [((), xat['pendents'])])
+    yield from _gauge('chat_saved_messages_total', 'Mensajes del chat guardados por lotes', [((), xat['desats'])], 'counter')
+    yield from _gauge('chat_flush_errors_total', 'Errores al guardar lotes del chat', [((), xat['errors'])], 'counter')
+    yield from _gauge('chat_dropped_messages_total', 'Mensajes del chat descartados por datos no válidos', [((), xat['descartats'])], 'counter')
+
+
+def render(socketio):
+    """Todas las métricas en formato de texto de Prometheus."""
+    linies = []
+    for metrica in registry:
+        linies.extend(metrica.collect())
+    linies.extend(_collect_state(socketio))
+    return '\n'.join(linies) + '\n'
+
+
+def init_app(app, socketio):
+    """Activa la instrumentación y registra /metrics. Llamar después de registrar las rutas."""
+    global enabled
+    if enabled:
+        return
+    enabled = True
+
+    from app.db import connect_listeners
+    connect_listeners.append(_instrument_connection)
+    _instrument_mtgsdk()
+    _instrument_socketio(socketio)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    def metrics():
+        return Response(render(socketio), mimetype='text/plain; version=0.0.4')
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,56 @@
+import queue  # Con eventlet.monkey_patch() la cola pasa a ser "verde"
+import threading
+from socketio import PubSubManager  # Base de los gestores de cola de python-socketio
+
+_canals = {}  # canal -> colas de los servidores suscritos
+_lock = threading.Lock()
+
+
+class MemoryPubSubManager(PubSubManager):
+    """Cola de mensajes en memoria para Socket.IO.
+
+    Sustituye a Redis/Kombu cuando varios servidores SocketIO viven en el
+    mismo proceso (pruebas y benchmarks): cada emit() llega a todos los
+    servidores suscritos al mismo canal, igual que con un broker real.
+    """
+    name = 'memory'
+
+    def __init__(self, url='memory://', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.url = url
+        self._cua = queue.Queue()
+        if not write_only:
+            with _lock:
+                _canals.setdefault(channel, []).append(self._cua)
+
+    def _publish(self, data):
+        with _lock:
+            cues = list(_canals.get(self.channel, ()))
+        for cua in cues:
+            cua.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._cua.get()
+
+    def close(self):
+        # Deja de recibir mensajes del canal
+        with _lock:
+            cues = _canals.get(self.channel, [])
+            if self._cua in cues:
+                cues.remove(self._cua)
+
+
+def socketio_options(config):
+    """Opciones de socketio.init_app según SOCKETIO_MESSAGE_QUEUE.
+
+    None: un solo proceso. 'memory://': cola en memoria (pruebas).
+    Cualquier otra URL (redis://, amqp://, ...) se pasa a Flask-SocketIO.
+    """
+    url = config.get('SOCKETIO_MESSAGE_QUEUE')
+    canal = config.get('SOCKETIO_CHANNEL', 'socketio')
+    if not url:
+        return {}
+    if url.startswith('memory://'):
+        return {'client_manager': MemoryPubSubManager(url, channel=canal)}
+    return {'message_queue': url, 'channel': canal}
@@ -1,15 +1,50 @@
-from flask import Blueprint, jsonify, request, session # Importa las bibliotecas necesarias de Flask
+from flask import Blueprint, Response, jsonify, request, session, g # Importa las bibliotecas necesarias de Flask
+import io
 from datetime import datetime 
 import mysql.connector  # Importa la biblioteca necesaria para conectarse a una base de datos MySQL
 from mysql.connector import errorcode  # Importa el módulo de errores de MySQL
-import bcrypt  # Importa la biblioteca para el hashing de contraseñas
-from mtgsdk import Card  # Importa la biblioteca para interactuar con la API de cartas
 from flask_socketio import emit
 from app import socketio # Importa la instancia de SocketIO
+from app.db import db_connection, lazy_db_connection, pool_stats  # Pool de conexiones a la base de datos
+from app.cataleg import resolve_cards, search_cards  # Catálogo local de cartas
+from app.cache import cache_stats  # Estadísticas de las cachés
+from app.autocomplete import name_index, LIMIT_PER_DEFECTE, LIMIT_MAXIM  # Índice de nombres de carta
+from app import usuaris  # Caché nombre de usuario <-> id
+from app.tokens import issue_token, verify_token, load_token_user, token_required  # Tokens de sesión firmados
+from app.xat import message_writer, conversation_id, create_conversation, update_summaries, mark_read, check_message, conversation_members  # Chat: conversaciones y guardado de mensajes
+from app.serialitzacio import query_rows, stream_json_array  # Respuestas JSON en streaming
+from app.decklist import import_lines, export_text, export_csv  # Listas de cartas en texto
+from app.coleccions import collection_stats, invalidate_stats  # Estadísticas de colecciones con caché
+from app.contrasenyes import hash_password, check_password, password_stats, PasswordPoolBusy  # bcrypt fuera del hub
 from flask_socketio import join_room, leave_room  # Importa funciones para manejar salas de WebSocket
 
 # Crea un Blueprint para la API con un prefijo de URL '/api'
 api = Blueprint('api', __name__, url_prefix='/api')
+api.before_request(load_token_user)  # Si la petición trae token, g.user_id ya está verificado
+
+def usuari_actual(cnx, nom):
+    # Con token no hace falta resolver el nombre en la base de datos
+    if g.get('user_id'):
+        return g.user_id
+    return usuaris.user_id(cnx, nom)
+
+def servidor_ocupat():
+    # Respuesta cuando hay demasiadas operaciones de bcrypt en cola
+    resposta = jsonify({'error': 'Servidor ocupat, torna-ho a provar', 'status': 'error'})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
+def arg_enter(nom, defecte=None, minim=None, maxim=None):
+    # Lee un parámetro entero de la URL y lo acota; lanza ValueError si no es un número
+    valor = request.args.get(nom)
+    if valor is None or valor == '':
+        return defecte
+    valor = int(valor)
+    if minim is not None:
+        valor = max(valor, minim)
+    if maxim is not None:
+        valor = min(valor, maxim)
+    return valor
 
 @api.route('/login', methods=['POST'])
 def login():
@@ -20,37 +55,38 @@ def login():
         return jsonify({'error': 'Falta el usuari o la contrasenya', 'status': 'error'}), 400
     
     username_or_email = data['usuari']
-    password = data['contrasenya'].encode('utf-8')  # Convierte la contraseña a bytes para bcrypt
+    password = data['contrasenya']
     
     try:
-        cnx = databaseconnection()  # Establece la conexión a la base de datos
-        if cnx.is_connected():
+        with db_connection() as cnx:  # Obtiene una conexión del pool
             with cnx.cursor(dictionary=True) as cursor:  # Usa un cursor que devuelve diccionarios
                 # Consulta para buscar el usuario por nombre o correo
                 cursor.execute("SELECT id, nom_usuari, correu, contrasenya FROM usuari WHERE nom_usuari = %s OR correu = %s", 
                               (username_or_email, username_or_email))
                 user = cursor.fetchone()  # Obtiene el primer resultado
                 
-                if not user:
-                    return jsonify({'error': 'No es pot trobar a cap usuari amb aquest nom o correu', 'status': 'error'}), 404
-                
-                # Verifica la contraseña hasheada
-                if bcrypt.checkpw(password, user['contrasenya'].encode('utf-8')):
-                    # Contraseña correcta - retorna éxito (sin datos sensibles)
-                    result = {
-                        'status': 'success'
-                    }
-                    return jsonify(result)
-                else:
-                    return jsonify({'error': 'Contrasenya incorrecta', 'status': 'error'}), 401
+        if not user:
+            return jsonify({'error': 'No es pot trobar a cap usuari amb aquest nom o correu', 'status': 'error'}), 404
+        
+        # Verifica la contraseña hasheada (en un hilo nativo, sin ocupar la conexión)
+        if check_password(password, user['contrasenya']):
+            # Contraseña correcta - retorna el token de sesión (sin datos sensibles)
+            result = {
+                'status': 'success',
+                'token': issue_token(user['id']),
+                'id': user['id'],
+                'nom_usuari': user['nom_usuari']
+            }
+            return jsonify(result)
+        else:
+            return jsonify({'error': 'Contrasenya incorrecta', 'status': 'error'}), 401
+    except PasswordPoolBusy:
+        return servidor_ocupat()
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return jsonify({'error': 'Error de base de datos', 'status': 'error'}), 500
     except Exception as e:
         return jsonify({'error': str(e), 'status': 'error'}), 500
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()  # Cierra la conexión a la base de datos
 
 @api.route('/register', methods=['POST'])
 def register():
@@ -65,12 +101,10 @@ def register():
     contrasenya = data['contrasenya']
     
     try:
-        # Genera un salt y hash de la contraseña
-        salt = bcrypt.gensalt()
-        contrasenya_hash = bcrypt.hashpw(contrasenya.encode('utf-8'), salt)
+        # Genera el hash de la contraseña (en un hilo nativo)
+        contrasenya_hash = hash_password(contrasenya)
         
-        cnx = databaseconnection()  # Establece la conexión a la base de datos
-        if cnx.is_connected():
+        with db_connection() as cnx:  # Obtiene una conexión del pool
             with cnx.cursor() as cursor:
                 # Verifica si ya existe un usuario con ese nombre o correo
                 cursor.execute("SELECT id FROM usuari WHERE correu = %s", (correu,))
@@ -96,6 +130,8 @@ def register():
                              (correu, contrasenya_hash, usuari))
                 cnx.commit()  # Confirma los cambios en la base de datos
                 return jsonify({'message': 'Usuari creat correctament', 'status': 'success'}), 201
+    except PasswordPoolBusy:
+        return servidor_ocupat()
     except mysql.connector.Error as err:
         if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
             return jsonify({'error': 'Incorrect user', 'status': 'error'}), 403
@@ -103,9 +139,6 @@ def register():
             return jsonify({'error': 'Database does not exist', 'status': 'error'}), 404
         else:
             return jsonify({'error': str(err), 'status': 'error'}), 500
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()  # Cierra la conexión a la base de datos
 
 @api.route('/carta/web', methods=['POST'])
 def trobar_carta_web():
@@ -114,42 +147,56 @@ def trobar_carta_web():
     # Verifica que los datos contengan 'nom'
     if not data or 'nom' not in data:
         return jsonify({'error': 'Falta el id de la carta', 'status': 'error'}), 400
-    nom = data['nom'].capitalize()
-    # Obtiene todas las cartas que coinciden con el nombre
-    cards = Card.where(name=nom).all()
-    if not cards:
+    nom = data['nom']
+    prefix = bool(data.get('prefix', False))  # Si es cierto, busca por prefijo del nombre
+    # Busca en el catálogo local y, si no hay resultados, en la API (con caché y sin ocupar el pool)
+    cartes = search_cards(nom, prefix=prefix)
+    if not cartes:
         return jsonify({'error': 'No es pot trobar cap carta amb aquest nom', 'status': 'error'}), 404
     else:
         return jsonify([
             {
-                'id': card.multiverse_id,
-                'nom': card.name,
-                'imatge': card.image_url,
-                'expansio': card.set
-            } for card in cards if card.name == nom or card.name == data['nom'].lower()
+                'id': carta['id_carta'],
+                'nom': carta['nom'],
+                'imatge': carta['imatge'],
+                'expansio': carta['expansio']
+            } for carta in cartes
         ]), 200  
 
+@api.route('/carta/autocomplete', methods=['GET'])
+def autocompletar_carta():
+    """Sugiere nombres de carta a partir de lo que el usuario lleva escrito"""
+    q = request.args.get('q', '')
+    if not q.strip():
+        return jsonify([])  # Sin texto no hay sugerencias
+    try:
+        limit = arg_enter('limit', LIMIT_PER_DEFECTE, 1, LIMIT_MAXIM)
+    except ValueError:
+        return jsonify({'error': 'El límit ha de ser un número', 'status': 'error'}), 400
+    fuzzy = request.args.get('fuzzy', '1') != '0'  # Tolerancia a errores tipográficos
+
+    name_index.ensure_loaded()  # Peticiones antes de que acabe la carga inicial: solo una la hace
+    return jsonify(name_index.search(q, limit=limit, fuzzy=fuzzy)), 200
+
 @api.route('/coleccio', methods=['POST'])
 def crear_coleccio():
     # Obtiene los datos JSON de la solicitud
     data = request.get_json()
     # Verifica que los datos contengan 'usr' y 'nom_col'
-    if not data or 'usr' not in data or 'nom_col' not in data:
+    if not data or ('usr' not in data and not g.user_id) or 'nom_col' not in data:
         return jsonify({'error': 'Falta el nom d\'usuari o el nom de la col·lecció', 'status': 'error'}), 400
     
-    cnx = databaseconnection()  # Establece la conexión a la base de datos
     coleccio = data['nom_col']
-    usr = data['usr']
+    usr = data.get('usr')
     
-    if cnx.is_connected():
+    with db_connection() as cnx:  # Obtiene una conexión del pool
         with cnx.cursor(dictionary=True) as cursor:
             # Verifica si el usuario existe
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (usr,))
-            id_user = cursor.fetchone()
+            id_user = usuari_actual(cnx, usr)
             
             if id_user:
                 # Inserta la nueva colección en la base de datos
-                cursor.execute("INSERT INTO coleccio(id_user,nombre) VALUES(%s,%s)", (id_user['id'], coleccio))
+                cursor.execute("INSERT INTO coleccio(id_user,nombre) VALUES(%s,%s)", (id_user, coleccio))
                 cnx.commit()  # Confirma los cambios
                 return jsonify({'message': 'Col·lecció creada correctament', 'status': 'success'}), 201
             else:
@@ -165,18 +212,28 @@ def afegir_carta_coleccio():
     
     carta = data['id_carta']
     id_col = data['id_col']
-    cnx = databaseconnection()  # Establece la conexión a la base de datos
+    try:
+        quantitat = int(data.get('quantitat', 1))  # Copias a añadir
+    except (TypeError, ValueError):
+        quantitat = 0
+    if quantitat < 1:
+        return jsonify({'error': 'La quantitat ha de ser un número positiu', 'status': 'error'}), 400
     
     try:
-        if cnx.is_connected():
-            with cnx.cursor(dictionary=True) as cursor:
+        with db_connection() as cnx:  # Obtiene una conexión del pool
+            with cnx.cursor() as cursor:
+                # La colección debe existir y, con token, ser del usuario
+                error = comprovar_coleccio(cursor, id_col)
+                if error:
+                    return error
                 # Verifica si la carta ya está en la colección
                 cursor.execute("SELECT id_carta FROM cartes WHERE id_carta = %s", (carta,))
                 existing_card = cursor.fetchone()
                 if existing_card:
-                    # Inserta la carta en la colección
-                    cursor.execute("INSERT INTO coleccio_cartes(id_coleccio, id_carta) VALUES(%s,%s)", (id_col , carta))
+                    # Inserta la carta en la colección o suma las copias si ya estaba
+                    cursor.execute(UPSERT_COLECCIO_CARTES, (id_col, carta, quantitat))
                     cnx.commit()  # Confirma los cambios
+                    invalidate_stats(id_col)
                     return jsonify({'Success': 'Carta afegida correctament a la col·lecció', 'status': 'success'}), 200
                 else:
                     return jsonify({'error': 'La carta no existeix', 'status': 'error'}), 404
@@ -184,24 +241,134 @@ def afegir_carta_coleccio():
         print(f"Error: {e}")
         return jsonify({'error': 'Error', 'status': 'error'}), 500
 
+# Añade copias de una carta a una colección (fila única por carta con su cantidad)
+UPSERT_COLECCIO_CARTES = """
+    INSERT INTO coleccio_cartes(id_coleccio, id_carta, quantitat) VALUES(%s,%s,%s)
+    ON DUPLICATE KEY UPDATE quantitat = quantitat + VALUES(quantitat)
+"""
+
+def comprovar_coleccio(cursor, id_col):
+    # Respuesta de error si la colección no existe o (con token) no es del usuario; None si es correcta
+    cursor.execute("SELECT id_user FROM coleccio WHERE id = %s", (id_col,))
+    coleccio = cursor.fetchone()
+    if not coleccio:
+        return jsonify({'error': 'La col·lecció no existeix', 'status': 'error'}), 404
+    if g.user_id is not None and coleccio[0] != g.user_id:
+        return jsonify({'error': 'La col·lecció no és teva', 'status': 'error'}), 403
+    return None
+
+MAX_CARTES_BULK = 1000  # Entradas máximas (afegir + treure) por petición
+MAX_QUANTITAT_BULK = 1000  # Copias máximas de una carta por entrada
+
+def llegir_entrades_bulk(entrades):
+    # Convierte [{'id_carta': 1, 'quantitat': 2}, 3, ...] en {id_carta: quantitat}; ValueError si no es válido
+    quantitats = {}
+    for entrada in entrades or []:
+        if isinstance(entrada, dict):
+            id_carta, quantitat = entrada.get('id_carta'), entrada.get('quantitat', 1)
+        else:
+            id_carta, quantitat = entrada, 1
+        id_carta, quantitat = int(id_carta), int(quantitat)
+        if quantitat < 1 or quantitat > MAX_QUANTITAT_BULK:
+            raise ValueError(f'Quantitat no vàlida per a la carta {id_carta}')
+        quantitats[id_carta] = quantitats.get(id_carta, 0) + quantitat
+    return quantitats
+
+@api.route('/carta/coleccio/bulk', methods=['POST'])
+def bulk_cartes_coleccio():
+    """Afegeix i treu moltes cartes d'una col·lecció en una sola transacció.
+
+    Cos: {'id_col': 1, 'afegir': [{'id_carta': 123, 'quantitat': 4}, 456], 'treure': [...]}.
+    Retorna el resultat de cada id: afegida / no_existeix, treta / no_hi_era.
+    """
+    data = request.get_json()
+    if not data or 'id_col' not in data or not (data.get('afegir') or data.get('treure')):
+        return jsonify({'error': 'Falta l\'id de la col·lecció o les cartes', 'status': 'error'}), 400
+    try:
+        afegir = llegir_entrades_bulk(data.get('afegir'))
+        treure = llegir_entrades_bulk(data.get('treure'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Llista de cartes no vàlida: {e}', 'status': 'error'}), 400
+    if len(afegir) + len(treure) > MAX_CARTES_BULK:
+        return jsonify({'error': f'Com a màxim {MAX_CARTES_BULK} cartes per petició', 'status': 'error'}), 400
+    id_col = data['id_col']
+
+    try:
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            error = comprovar_coleccio(cursor, id_col)
+            if error:
+                return error
+
+            # Valida totes les cartes a afegir amb una sola consulta
+            existents = set()
+            if afegir:
+                marcadors = ', '.join(['%s'] * len(afegir))
+                cursor.execute(f"SELECT id_carta FROM cartes WHERE id_carta IN ({marcadors})", list(afegir))
+                existents = {fila[0] for fila in cursor.fetchall()}
+
+            # Còpies actuals de les cartes a treure (bloquejades fins al commit)
+            copies = {}
+            if treure:
+                marcadors = ', '.join(['%s'] * len(treure))
+                cursor.execute(f"""
+                    SELECT id_carta, quantitat FROM coleccio_cartes
+                    WHERE id_coleccio = %s AND id_carta IN ({marcadors})
+                    FOR UPDATE
+                """, [id_col, *treure])
+                copies = dict(cursor.fetchall())
+
+            # Un sol INSERT de diverses files amb la diferència de cada carta
+            # (positiva per afegir, negativa per treure) i un DELETE de les que queden a zero
+            deltes = {}
+            for id_carta, quantitat in afegir.items():
+                if id_carta in existents:
+                    deltes[id_carta] = quantitat
+            for id_carta, quantitat in treure.items():
+                if copies.get(id_carta):
+                    deltes[id_carta] = deltes.get(id_carta, 0) - min(quantitat, copies[id_carta])
+            files = [(id_col, id_carta, delta) for id_carta, delta in deltes.items() if delta]
+            if files:
+                cursor.executemany(UPSERT_COLECCIO_CARTES, files)
+            buides = [id_carta for id_carta in treure if copies.get(id_carta)]
+            if buides:
+                marcadors = ', '.join(['%s'] * len(buides))
+                cursor.execute(f"""
+                    DELETE FROM coleccio_cartes
+                    WHERE id_coleccio = %s AND id_carta IN ({marcadors}) AND quantitat <= 0
+                """, [id_col, *buides])
+            cnx.commit()  # Tot o res
+        if files:
+            invalidate_stats(id_col)
+
+        resultats = [
+            {'id_carta': id_carta, 'operacio': 'afegir', 'quantitat': quantitat,
+             'resultat': 'afegida' if id_carta in existents else 'no_existeix'}
+            for id_carta, quantitat in afegir.items()
+        ] + [
+            {'id_carta': id_carta, 'operacio': 'treure', 'quantitat': min(quantitat, copies.get(id_carta, 0)),
+             'resultat': 'treta' if copies.get(id_carta) else 'no_hi_era'}
+            for id_carta, quantitat in treure.items()
+        ]
+        return jsonify({'resultats': resultats, 'status': 'success'}), 200
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': 'Error de base de dades', 'status': 'error'}), 500
+
 @api.route('/coleccio/mostrar', methods=['POST', 'GET'])
 def mostrar_coleccions():
     # Obtiene los datos JSON de la solicitud
     data = request.get_json()
     # Verifica que los datos contengan 'usr'
-    if not data or 'usr' not in data:
+    if (not data or 'usr' not in data) and not g.user_id:
         return jsonify({'error': 'Falta el nom d\'usuari', 'status': 'error'}), 400
     
-    cnx = databaseconnection()  # Establece la conexión a la base de datos
-    usr = data['usr']
+    usr = (data or {}).get('usr')
     
     try:
-        if cnx.is_connected():
+        with db_connection() as cnx:  # Obtiene una conexión del pool
             with cnx.cursor(dictionary=True) as cursor:
                 # Busca el ID del usuario
-                cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (usr,))
-                id_user = cursor.fetchone()
-                user_id = id_user['id']
+                user_id = usuari_actual(cnx, usr)
                 
                 if user_id:
                     # Obtiene las colecciones del usuario
@@ -217,6 +384,21 @@ def mostrar_coleccions():
         print(f"Error: {e}")
         return jsonify({'error': 'Error de base de dades', 'status': 'error'}), 500
 
+def resoldre_desconegudes(id_col):
+    # Cartas de la colección que aún no están en el catálogo local
+    with db_connection() as cnx, cnx.cursor() as cursor:
+        cursor.execute("""
+            SELECT cc.id_carta
+            FROM coleccio_cartes cc
+            LEFT JOIN cartes c ON c.id_carta = cc.id_carta
+            WHERE cc.id_coleccio = %s AND c.nom IS NULL
+        """, (id_col,))
+        desconegudes = [fila[0] for fila in cursor.fetchall()]
+
+    # Se piden a la API (sin conexión del pool) y se guardan en el catálogo antes de listar
+    if desconegudes and resolve_cards(desconegudes):
+        invalidate_stats(id_col)  # Cambia 'sense_dades' y los desgloses
+
 @api.route('/carta/coleccio/mostrar', methods=['GET'])
 def mostrar_coleccio():
     # Obtiene los datos JSON de la solicitud
@@ -226,56 +408,133 @@ def mostrar_coleccio():
         return jsonify({'error': 'Falta el id de la carta o el nom d\'usuari', 'status': 'error'}), 400
     
     id_col = data['id_col']
-    cnx = databaseconnection()  # Establece la conexión a la base de datos
     
-    if cnx.is_connected():
-        with cnx.cursor(dictionary=True) as cursor:
-            # Busca las cartas en la colección
-            cursor.execute("SELECT id_carta FROM coleccio_cartes WHERE id_coleccio = %s", (id_col,))
-            ids_cartes = cursor.fetchall()
-
-            cartas_encontradas = []
-            for id_carta in ids_cartes:
-                # Accede al valor del ID
-                multiverse_id = id_carta['id_carta'] if isinstance(id_carta, dict) else id_carta[0]
-                
-                # Busca la carta por su multiverse ID
-                cards = Card.where(multiverseid=multiverse_id).all()
-                
-                # Añade todas las cartas encontradas
-                for card in cards:
-                    cartas_encontradas.append({
-                        'nom': card.name,
-                        'imatge': card.image_url,
-                        'id_carta': card.multiverse_id  # Añadido ID para referencia
-                    })
+    resoldre_desconegudes(id_col)
 
-            if not cartas_encontradas:
-                return jsonify({'error': 'No se encontraron cartas para esta colección'}), 404
+    # La lista (una entrada por carta, con sus copias) se envía en streaming desde el cursor
+    files = query_rows("""
+        SELECT c.nom, c.imatge, cc.id_carta, cc.quantitat
+        FROM coleccio_cartes cc
+        JOIN cartes c ON c.id_carta = cc.id_carta
+        WHERE cc.id_coleccio = %s AND c.nom IS NOT NULL
+    """, (id_col,))
+    primera = next(files, None)
+    if primera is None:
+        return jsonify({'error': 'No se encontraron cartas para esta colección'}), 404
 
-            return jsonify(cartas_encontradas), 200
+    return stream_json_array(files, primeres=[primera])
+
+@api.route('/coleccio/<int:id_col>/importar', methods=['POST'])
+def importar_llista(id_col):
+    """Afegeix a la col·lecció una llista de cartes en text ("4 Lightning Bolt" per línia).
+
+    El cos és el text (text/plain) o un fitxer 'llista' en multipart. Es llegeix línia a
+    línia i els noms es resolen contra el catàleg local per lots, en una sola transacció.
+    """
+    # Solo texto plano o multipart: con un formulario urlencoded Werkzeug ya habría consumido el cuerpo
+    if request.mimetype == 'multipart/form-data':
+        fitxer = request.files.get('llista')
+        if not fitxer:
+            return jsonify({'error': 'Falta el fitxer \'llista\'', 'status': 'error'}), 400
+        flux = fitxer.stream
+    elif request.mimetype.startswith('text/'):
+        flux = request.stream
+    else:
+        return jsonify({'error': 'Envia la llista com a text/plain o com a fitxer \'llista\' en multipart',
+                        'status': 'error'}), 415
+    linies = io.TextIOWrapper(flux, encoding='utf-8', errors='replace')
+
+    try:
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            error = comprovar_coleccio(cursor, id_col)
+            if error:
+                return error
+            resum = import_lines(cursor, id_col, linies, UPSERT_COLECCIO_CARTES)
+            cnx.commit()  # Tot o res
+        invalidate_stats(id_col)
+        return jsonify({**resum, 'status': 'success'}), 200
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': 'Error de base de dades', 'status': 'error'}), 500
+
+# Formatos de exportación: (generador de bytes, tipo MIME, extensión)
+FORMATS_EXPORTACIO = {
+    'text': (export_text, 'text/plain; charset=utf-8', 'txt'),
+    'csv': (export_csv, 'text/csv; charset=utf-8', 'csv'),
+    'json': (None, 'application/json', 'json'),
+}
+
+@api.route('/coleccio/<int:id_col>/exportar', methods=['GET'])
+def exportar_llista(id_col):
+    # Descarga la colección en streaming: ?format=text (por defecto), csv o json
+    format_ = request.args.get('format', 'text')
+    if format_ not in FORMATS_EXPORTACIO:
+        return jsonify({'error': f"Format desconegut, fes servir {', '.join(FORMATS_EXPORTACIO)}", 'status': 'error'}), 400
+    exportador, mimetype, extensio = FORMATS_EXPORTACIO[format_]
+
+    with db_connection() as cnx, cnx.cursor() as cursor:
+        error = comprovar_coleccio(cursor, id_col)
+    if error:
+        return error
+    resoldre_desconegudes(id_col)
+
+    files = query_rows("""
+        SELECT cc.quantitat, c.nom, c.expansio, cc.id_carta
+        FROM coleccio_cartes cc
+        JOIN cartes c ON c.id_carta = cc.id_carta
+        WHERE cc.id_coleccio = %s AND c.nom IS NOT NULL
+        ORDER BY c.nom, cc.id_carta
+    """, (id_col,))
+    if exportador is None:
+        resposta = stream_json_array(files)
+    else:
+        def generate():
+            try:
+                yield from exportador(files)
+            finally:
+                files.close()  # Devuelve la conexión aunque el cliente corte la descarga
+        resposta = Response(generate(), mimetype=mimetype)
+    resposta.headers['Content-Disposition'] = f'attachment; filename="coleccio_{id_col}.{extensio}"'
+    return resposta
+
+@api.route('/coleccio/<int:id_col>/stats', methods=['GET'])
+def estadistiques_coleccio(id_col):
+    # Resumen de la colección calculado en SQL (copias, expansiones, colores, tipos y curva de maná)
+    try:
+        with db_connection() as cnx:
+            with cnx.cursor() as cursor:
+                error = comprovar_coleccio(cursor, id_col)
+            if error:
+                return error
+            return jsonify({**collection_stats(cnx, id_col), 'status': 'success'}), 200
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': 'Error de base de dades', 'status': 'error'}), 500
 
 @api.route('/coleccio/eliminar', methods=['POST'])
 def eliminar_coleccio():
     # Obtiene los datos JSON de la solicitud
     data = request.get_json()
     # Verifica que los datos contengan 'usr' y 'nom_col'
-    if not data or 'usr' not in data:
+    if not data or ('usr' not in data and not g.user_id):
         return jsonify({'error': 'Falta el nom d\'usuari o el nom de la col·lecció', 'status': 'error'}), 400
     
-    cnx = databaseconnection()  # Establece la conexión a la base de datos
-    usr = data['usr']
+    usr = data.get('usr')
     id = data['id']
     print(usr, id)
-    if cnx.is_connected():
-        with cnx.cursor(dictionary=True) as cursor:
+    with db_connection() as cnx:  # Obtiene una conexión del pool
+        with cnx.cursor() as cursor:
             # Verifica si el usuario existe
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (usr,))
-            id_user = cursor.fetchone()
+            id_user = usuari_actual(cnx, usr)
             if id_user:
+                # La colección debe existir y, con token, ser del usuario
+                error = comprovar_coleccio(cursor, id)
+                if error:
+                    return error
                 # Elimina la colección de la base de datos
                 cursor.execute("DELETE FROM coleccio WHERE id= %s", (id,))
                 cnx.commit()  # Confirma los cambios
+                invalidate_stats(id)
                 return jsonify({'message': 'Col·lecció eliminada correctament', 'status': 'success'}), 200
             else:
                 return jsonify({'error': 'el ususari no existeix', 'status': 'error'}), 409
@@ -288,8 +547,7 @@ def buscar_usuarios():
         return jsonify([])  # Si no hay término de búsqueda, retorna lista vacía
 
     try:
-        cnx = databaseconnection()
-        if cnx.is_connected():
+        with db_connection() as cnx:
             with cnx.cursor(dictionary=True) as cursor:
                 # Busca usuarios cuyo nombre comience con el término de búsqueda (insensible a mayúsculas)
                 query = """
@@ -308,49 +566,31 @@ def buscar_usuarios():
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'error': 'Error inesperado', 'status': 'error'}), 500
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()
   
 @api.route('/chat/nuevo', methods=['POST'])
 def crear_conversacion():
     data = request.get_json()
-    if not data or 'id_usuario1' not in data or 'id_usuario2' not in data:
+    if not data or ('id_usuario1' not in data and not g.user_id) or 'id_usuario2' not in data:
         return jsonify({'error': 'Se requieren los IDs de ambos usuarios'}), 400
     
-    usuari1 = data['id_usuario1']
+    usuari1 = data.get('id_usuario1')
     usuari2 = data['id_usuario2']
     
     try:
-        cnx = databaseconnection()
-        with cnx.cursor(dictionary=True) as cursor:  # Usar cursor de diccionario
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (usuari1,))
-            id_user = cursor.fetchone()
-            if not id_user:
+        with db_connection() as cnx:
+            user_id = usuari_actual(cnx, usuari1)
+            if not user_id:
                 return jsonify({'error': 'Usuario no encontrado'}), 404
-                
-            user_id = id_user['id']
             
             # Verificar si ya existe una conversación
-            cursor.execute("""
-                SELECT id_conversacion FROM conversaciones 
-                WHERE (id_usuario1 = %s AND id_usuario2 = %s) 
-                OR (id_usuario1 = %s AND id_usuario2 = %s)
-            """, (user_id, usuari2, usuari2, user_id))
-            
-            if cursor.fetchone():
+            if conversation_id(cnx, user_id, usuari2):
                 return jsonify({'error': 'Ya existe una conversación entre estos usuarios'}), 409
 
-            # Crear nueva conversación
-            cursor.execute("""
-                INSERT INTO conversaciones (id_usuario1, id_usuario2) 
-                VALUES (%s, %s)
-            """, (user_id, usuari2))
-            cnx.commit()
-            
-            # Obtener el ID de la nueva conversación
-            cursor.execute("SELECT LAST_INSERT_ID() AS id_conversacion")
-            id_conversacion = cursor.fetchone()['id_conversacion']
+            # Crear nueva conversación (el índice único evita duplicados simultáneos)
+            try:
+                id_conversacion = create_conversation(cnx, user_id, usuari2)
+            except mysql.connector.IntegrityError:
+                return jsonify({'error': 'Ya existe una conversación entre estos usuarios'}), 409
             
             return jsonify({
                 'id_conversacion': id_conversacion,
@@ -360,88 +600,159 @@ def crear_conversacion():
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()
                   
+MIDA_PAGINA_CONVERSES = 30  # Conversaciones por página de la bandeja de entrada
+MIDA_PAGINA_CONVERSES_MAXIMA = 100
+
 @api.route('/chat/conversaciones/<string:user_id>', methods=['GET'])
 def get_conversaciones(user_id):
-    """Obtiene todas las conversaciones de un usuario"""
+    """Obtiene las conversaciones de un usuario, las más activas primero.
+
+    Cada conversación incluye el último mensaje, su fecha y los mensajes no
+    leídos. Parámetros: limit y cursor (el next_cursor de la página anterior).
+    """
     try:
-        cnx = databaseconnection()
-        with cnx.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (user_id,))
-            id_user = cursor.fetchone()
-            user_id = id_user['id']
-            
-            cursor.execute("""
-                SELECT c.id_conversacion, 
-                       CASE 
-                           WHEN c.id_usuario1 = %s THEN u2.nom_usuari
-                           ELSE u1.nom_usuari
-                       END AS nombre_contacto
-                FROM conversaciones c
-                JOIN usuari u1 ON c.id_usuario1 = u1.id
-                JOIN usuari u2 ON c.id_usuario2 = u2.id
-                WHERE c.id_usuario1 = %s OR c.id_usuario2 = %s
-            """, (user_id, user_id, user_id))
-            return jsonify(cursor.fetchall()),200
+        limit = arg_enter('limit', MIDA_PAGINA_CONVERSES, 1, MIDA_PAGINA_CONVERSES_MAXIMA)
+        cursor_pagina = request.args.get('cursor')
+        if cursor_pagina:
+            # El cursor es "<actividad ISO>_<id_conversacion>"
+            actividad, id_cursor = cursor_pagina.rsplit('_', 1)
+            cursor_pagina = (datetime.fromisoformat(actividad), int(id_cursor))
+    except ValueError:
+        return jsonify({'error': 'El cursor o el límite no són vàlids'}), 400
+
+    try:
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            user_id = usuaris.user_id(cnx, user_id)
+            if not user_id:
+                return jsonify({'error': 'Usuario no encontrado'}), 404
+
+            # Cada mitad usa su índice (usuari_min|usuari_max, actividad, id_conversacion)
+            condicion, params = "", []
+            if cursor_pagina:
+                condicion = "AND (actividad, id_conversacion) < (%s, %s)"
+                params = list(cursor_pagina)
+            columnas = "id_conversacion, ultimo_mensaje_id, ultimo_mensaje, ultimo_remitente, actividad"
+            cursor.execute(f"""
+                SELECT c.id_conversacion, u.nom_usuari AS nombre_contacto,
+                       c.ultimo_mensaje, c.ultimo_remitente, c.actividad,
+                       (SELECT COUNT(*) FROM mensajes_privados m
+                        WHERE m.id_conversacion = c.id_conversacion
+                          AND m.id > COALESCE(l.ultimo_leido, 0)
+                          AND m.id_remitente <> %s) AS no_leidos
+                FROM (
+                    (SELECT {columnas}, usuari_max AS id_contacto FROM conversaciones
+                     WHERE usuari_min = %s {condicion}
+                     ORDER BY actividad DESC, id_conversacion DESC LIMIT %s)
+                    UNION ALL
+                    (SELECT {columnas}, usuari_min AS id_contacto FROM conversaciones
+                     WHERE usuari_max = %s AND usuari_min <> %s {condicion}
+                     ORDER BY actividad DESC, id_conversacion DESC LIMIT %s)
+                ) c
+                JOIN usuari u ON u.id = c.id_contacto
+                LEFT JOIN conversaciones_lectura l
+                    ON l.id_conversacion = c.id_conversacion AND l.id_usuario = %s
+                ORDER BY c.actividad DESC, c.id_conversacion DESC
+                LIMIT %s
+            """, (user_id,
+                  user_id, *params, limit + 1,
+                  user_id, user_id, *params, limit + 1,
+                  user_id, limit + 1))
+            conversaciones = cursor.fetchall()
+
+            next_cursor = None
+            if len(conversaciones) > limit:
+                conversaciones = conversaciones[:limit]
+                ultima = conversaciones[-1]
+                next_cursor = f"{ultima['actividad'].isoformat()}_{ultima['id_conversacion']}"
+            return jsonify({'conversaciones': conversaciones, 'next_cursor': next_cursor}), 200
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()
+
+MIDA_PAGINA_XAT = 50  # Mensajes por página del historial
+MIDA_PAGINA_XAT_MAXIMA = 200  # Máximo de mensajes por petición (también en modo since)
 
 @api.route('/chat/mensajes/<string:conversacion_id>/<string:user>', methods=['GET'])
 def obtener_mensajes(conversacion_id,user):
-    """Obtiene todos los mensajes de una conversación específica"""
+    """Obtiene una página de mensajes de una conversación.
+
+    Sin cursor devuelve los más recientes. before=<id> pide mensajes anteriores,
+    after=<id> los siguientes y since=<id> todos los nuevos desde ese id
+    (hasta MIDA_PAGINA_XAT_MAXIMA). Los mensajes van siempre en orden cronológico.
+    """
     try:
-        cnx = databaseconnection()
-        with cnx.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (conversacion_id,))
-            id_user_conversacion = cursor.fetchone()
-            id_user_conversacion = id_user_conversacion['id']
-            if not id_user_conversacion:
-                return jsonify({'error': 'Usuario no encontrado'}), 404
-            
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (user,))
-            id_user = cursor.fetchone()
-            id_user = id_user['id']
-            
-            if not id_user:
+        before = arg_enter('before')
+        after = arg_enter('after')
+        since = arg_enter('since')
+        limit = arg_enter('limit', MIDA_PAGINA_XAT, 1, MIDA_PAGINA_XAT_MAXIMA)
+    except ValueError:
+        return jsonify({'error': 'Los cursores y el límite deben ser números'}), 400
+    if since is not None:
+        after, limit = since, MIDA_PAGINA_XAT_MAXIMA
+
+    try:
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            # Resuelve los dos usuarios a la vez (caché o una sola consulta)
+            ids = usuaris.user_ids(cnx, [conversacion_id, user])
+            id_user_conversacion = ids.get(conversacion_id)
+            id_user = ids.get(user)
+            if not id_user_conversacion or not id_user:
                 return jsonify({'error': 'Usuario no encontrado'}), 404
             
-            # Obtener mensajes y información del remitente
-            cursor.execute("""
-                SELECT id_conversacion
-                FROM conversaciones
-                WHERE (id_usuario1 = %s AND id_usuario2 = %s)
-                OR (id_usuario1 = %s AND id_usuario2 = %s)
-                GROUP BY id_conversacion
-            """, (id_user, id_user_conversacion, id_user_conversacion, id_user))
-            
-            id_conversacion = cursor.fetchone()
+            id_conversacion = conversation_id(cnx, id_user, id_user_conversacion)
+            if not id_conversacion:
+                return jsonify({'error': 'Conversación no encontrada'}), 404
             
-            cursor.execute("""
-                SELECT id_remitente, mensaje, fecha_envio
+            # Paginación por id usando el índice (id_conversacion, id)
+            if after is not None:
+                condicion, orden, params = "AND id > %s", "ASC", [after]
+            elif before is not None:
+                condicion, orden, params = "AND id < %s", "DESC", [before]
+            else:
+                condicion, orden, params = "", "DESC", []
+            cursor.execute(f"""
+                SELECT id, id_remitente, mensaje, fecha_envio
                 from mensajes_privados
-                WHERE id_conversacion = %s
-                """,(id_conversacion['id_conversacion'],))
+                WHERE id_conversacion = %s {condicion}
+                ORDER BY id {orden}
+                LIMIT %s
+                """,(id_conversacion, *params, limit + 1))
             mensajes = cursor.fetchall()
             
-            return jsonify(mensajes), 200
+            # Si hay un mensaje de más, quedan mensajes en esa dirección
+            hay_mas = len(mensajes) > limit
+            mensajes = mensajes[:limit]
+            if orden == "DESC":
+                mensajes.reverse()
+
+            # Lo que el usuario acaba de descargar cuenta como leído (solo si es de la conversación;
+            # con token, el lector es el usuario del token)
+            lector = g.user_id or id_user
+            if mensajes and lector in (conversation_members(cnx, id_conversacion) or ()):
+                mark_read(cursor, id_conversacion, lector, mensajes[-1]['id'])
+                cnx.commit()
+            
+            return jsonify({
+                'id_conversacion': id_conversacion,
+                'mensajes': mensajes,
+                'hay_mas': hay_mas
+            }), 200
             
     except Exception as e:
         print(f"Error al obtener mensajes: {str(e)}")
         return jsonify({'error': 'Error al obtener mensajes'}), 500
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()
 
 # Manejo de conexiones WebSocket
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
+    # El cliente puede enviar el token de login en auth={'token': ...} o en ?token=
+    token = (auth or {}).get('token') or request.args.get('token')
+    if token:
+        user_id = verify_token(token)
+        if user_id is None:
+            return False  # Rechaza la conexión con un token inválido
+        session['user_id'] = user_id  # Sesión propia de este socket
     print(f'Cliente conectado: {request.sid}')
 
 @socketio.on('disconnect')
@@ -452,30 +763,18 @@ def handle_disconnect():
 def handle_join_conversation(data):
     try:
         user = data.get('usuario') 
-        id_user = data.get('id_usuario')# usuario actual
-        cnx = databaseconnection()
-        with cnx.cursor(dictionary=True) as cursor:
-            # Obtener ID del usuario actual
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (user,))
-            user_actual = cursor.fetchone()
-            if not user_actual:
+        id_user = session.get('user_id') or data.get('id_usuario')# usuario actual
+        # Con las cachés calientes no se pide ninguna conexión al pool
+        with lazy_db_connection() as cnx:
+            # Obtener ID del otro usuario de la conversación
+            id_user_conversacion = usuaris.user_id(cnx, user)
+            if not id_user_conversacion:
                 emit('error', {'error': 'Usuario actual no encontrado'})
                 return
-            
-            id_user_conversacion = user_actual['id']
-              # ID del usuario que se une a 
-            cursor.execute("""
-                SELECT id_conversacion
-                FROM conversaciones
-                WHERE (id_usuario1 = %s AND id_usuario2 = %s)
-                   OR (id_usuario1 = %s AND id_usuario2 = %s)
-                LIMIT 1
-            """, (id_user, id_user_conversacion, id_user_conversacion, id_user))
-
-            result = cursor.fetchone()
+
+            id_conversacion = conversation_id(cnx, id_user, id_user_conversacion)
     
-            if result:
-                id_conversacion = result['id_conversacion']
+            if id_conversacion:
                 print(f"Usuario {request.sid} unido a la sala {id_conversacion}")
                 join_room(id_conversacion)
                 emit('unido_a_conversacion', {'id_conversacion': id_conversacion})
@@ -485,9 +784,6 @@ def handle_join_conversation(data):
     except Exception as e:
         print(f"Error al unirse a la conversación: {str(e)}")
         emit('error', {'error': str(e)})
-    finally:
-        if   'cnx' in locals() and cnx.is_connected():
-            cnx.close()
 
 
 @socketio.on('salir_de_conversacion')
@@ -499,48 +795,75 @@ def handle_leave_conversation(data):
 @socketio.on('enviar_mensaje')
 def handle_enviar_mensaje(data):
     try:
-        cnx = databaseconnection()
-        with cnx.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO mensajes_privados (id_conversacion, id_remitente, mensaje)
-                VALUES (%s, %s, %s)
-            """, (data['id_conversacion'], data['id_remitente'], data['mensaje']))
-            cnx.commit()
+        # Con token, el remitente es el usuario verificado al conectar
+        id_remitente = session.get('user_id') or data['id_remitente']
+        # Se valida antes de guardar: un mensaje incorrecto solo falla para su remitente
+        with lazy_db_connection() as cnx:
+            try:
+                id_conversacion, id_remitente = check_message(cnx, data['id_conversacion'], id_remitente, data['mensaje'])
+            except ValueError as e:
+                emit('error', {'error': str(e)})
+                return
+        fecha_envio = datetime.now()
+        mensaje = {
+            'id_conversacion': id_conversacion,
+            'id_remitente': id_remitente,
+            'mensaje': data['mensaje'],
+            'fecha_envio': fecha_envio.isoformat()
+        }
+
+        if message_writer.enabled:
+            # Write-behind: se encola para guardarlo por lotes y se emite sin esperar al commit
+            message_writer.append(id_conversacion, id_remitente, data['mensaje'], fecha_envio)
+        else:
+            with db_connection() as cnx, cnx.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO mensajes_privados (id_conversacion, id_remitente, mensaje)
+                    VALUES (%s, %s, %s)
+                """, (id_conversacion, id_remitente, data['mensaje']))
+                update_summaries(cursor, [id_conversacion])
+                cnx.commit()
 
-            emit('nuevo_mensaje', {
-                'id_conversacion': data['id_conversacion'],
-                'id_remitente': data['id_remitente'],
-                'mensaje': data['mensaje'],
-                'fecha_envio': datetime.now().isoformat()
-            }, room=data['id_conversacion'], skip_sid=request.sid)
+        emit('nuevo_mensaje', mensaje, room=id_conversacion, skip_sid=request.sid)
 
     except Exception as e:
         print(e)
         emit('error', {'error': str(e)})
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()
+
+
+@socketio.on('marcar_leido')
+def handle_marcar_leido(data):
+    # El cliente con la conversación abierta marca como leído lo recibido por el socket
+    try:
+        id_usuario = int(session.get('user_id') or data['id_usuario'])
+        id_conversacion = int(data['id_conversacion'])
+        with db_connection() as cnx:
+            # Solo los participantes pueden mover su puntero de lectura
+            if id_usuario not in (conversation_members(cnx, id_conversacion) or ()):
+                emit('error', {'error': 'No ets d\'aquesta conversa'})
+                return
+            with cnx.cursor() as cursor:
+                mark_read(cursor, id_conversacion, id_usuario, data.get('id_mensaje'))
+            cnx.commit()
+    except Exception as e:
+        print(e)
+        emit('error', {'error': str(e)})
 
 
 @api.route('/usuario/id/<string:user>', methods=['GET'])
 def obtener_id_usuario(user):
     try:
-        cnx = databaseconnection()  # Establece la conexión a la base de datos
-        with cnx.cursor(dictionary=True) as cursor:
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
             # Busca el ID del usuario por su nombre
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (user,))
-            user = cursor.fetchone()
+            id_user = usuaris.user_id(cnx, user)
             
-            if user:
-                return jsonify({'id': user['id'], 'status': 'success'}), 200
+            if id_user:
+                return jsonify({'id': id_user, 'status': 'success'}), 200
             else:
                 return jsonify({'error': 'Usuari no trobat', 'status': 'error'}), 404
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'error': str(e), 'status': 'error'}), 500
-    finally:
-        if 'cnx' in locals() and cnx.is_connected():
-            cnx.close()
 
 @api.route('/informacion/contrasenya', methods=['POST'])  # Cambiado a POST que es más adecuado
 def cambiar_contrasenya():
@@ -553,57 +876,53 @@ def cambiar_contrasenya():
             'status': 'error'
         }), 400
     
-    cnx = databaseconnection()  # Establece la conexión a la base de datos
     usuari = data['usuari']
-    password = data['contrasenya'].encode('utf-8')
+    password = data['contrasenya']
     nova_contrasenya = data['nova_contrasenya']
         
     try:
-        if cnx.is_connected():
-            with cnx.cursor(dictionary=True) as cursor:
-                # 1. Verifica si el usuario existe y obtiene su contraseña actual
-                cursor.execute("SELECT id, contrasenya FROM usuari WHERE nom_usuari = %s", (usuari,))
-                usuari_data = cursor.fetchone()
-                
-                if not usuari_data:
-                    return jsonify({
-                        'error': 'Usuari no trobat',
-                        'status': 'error'
-                    }), 404
-                
-                # 2. Verifica que la contraseña actual sea correcta
-                if not bcrypt.checkpw(password, usuari_data['contrasenya'].encode('utf-8')):
-                    return jsonify({
-                        'error': 'Contrasenya actual incorrecta',
-                        'status': 'error'
-                    }), 401
-                
-                # 3. Hashea la nueva contraseña
-                nova_contrasenya_hash = bcrypt.hashpw(nova_contrasenya.encode('utf-8'), bcrypt.gensalt())
-                
-                # 4. Actualiza la contraseña en la base de datos
-                cursor.execute(
-                    "UPDATE usuari SET contrasenya = %s WHERE id = %s",
-                    (nova_contrasenya_hash.decode('utf-8'), usuari_data['id'])
-                )
-                cnx.commit()
-                
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Contrasenya actualitzada correctament'
-                }), 200
+        # 1. Verifica si el usuario existe y obtiene su contraseña actual
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT id, contrasenya FROM usuari WHERE nom_usuari = %s", (usuari,))
+            usuari_data = cursor.fetchone()
+        
+        if not usuari_data:
+            return jsonify({
+                'error': 'Usuari no trobat',
+                'status': 'error'
+            }), 404
+        
+        # 2. Verifica que la contraseña actual sea correcta (bcrypt sin ocupar la conexión)
+        if not check_password(password, usuari_data['contrasenya']):
+            return jsonify({
+                'error': 'Contrasenya actual incorrecta',
+                'status': 'error'
+            }), 401
+        
+        # 3. Hashea la nueva contraseña
+        nova_contrasenya_hash = hash_password(nova_contrasenya)
+        
+        # 4. Actualiza la contraseña en la base de datos
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            cursor.execute(
+                "UPDATE usuari SET contrasenya = %s WHERE id = %s",
+                (nova_contrasenya_hash, usuari_data['id'])
+            )
+            cnx.commit()
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Contrasenya actualitzada correctament'
+        }), 200
                 
+    except PasswordPoolBusy:
+        return servidor_ocupat()
     except Exception as e:
-        print(f"Error: {e}")
-        if cnx.is_connected():
-            cnx.rollback()  # Revertir cambios en caso de error
+        print(f"Error: {e}")  # El pool revierte los cambios pendientes al devolver la conexión
         return jsonify({
             'error': str(e),
             'status': 'error'
         }), 500
-    finally:
-        if cnx.is_connected():
-            cnx.close()
 
 @api.route('/informacion/nom', methods=['POST'])  # Cambiado a POST que es más adecuado
 def cambiar_nom():
@@ -616,76 +935,71 @@ def cambiar_nom():
             'status': 'error'
         }), 400
     
-    cnx = databaseconnection()  # Establece la conexión a la base de datos
     usuari = data['usuari']
-    password = data['contrasenya'].encode('utf-8')
+    password = data['contrasenya']
     nou_nom = data['nou_nom']
         
     try:
-        if cnx.is_connected():
-            with cnx.cursor(dictionary=True) as cursor:
-                # 1. Verifica si el usuario existe y obtiene su contraseña actual
-                cursor.execute("SELECT id, contrasenya FROM usuari WHERE nom_usuari = %s", (usuari,))
-                usuari_data = cursor.fetchone()
-                
-                if not usuari_data:
-                    return jsonify({
-                        'error': 'Usuari no trobat',
-                        'status': 'error'
-                    }), 404
-                
-                # 2. Verifica que la contraseña actual sea correcta
-                if not bcrypt.checkpw(password, usuari_data['contrasenya'].encode('utf-8')):
-                    return jsonify({
-                        'error': 'Contrasenya actual incorrecta',
-                        'status': 'error'
-                    }), 401
-                
-                # 3. Hashea la nueva contraseña
-                
-                # 4. Actualiza la contraseña en la base de datos
-                cursor.execute(
-                    "UPDATE usuari SET nom_usuari = %s WHERE id = %s",
-                    (nou_nom, usuari_data['id'])
-                )
-                cnx.commit()
-                
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Nom actualitzat correctament'
-                }), 200
+        # 1. Verifica si el usuario existe y obtiene su contraseña actual
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT id, contrasenya FROM usuari WHERE nom_usuari = %s", (usuari,))
+            usuari_data = cursor.fetchone()
+        
+        if not usuari_data:
+            return jsonify({
+                'error': 'Usuari no trobat',
+                'status': 'error'
+            }), 404
+        
+        # 2. Verifica que la contraseña actual sea correcta (bcrypt sin ocupar la conexión)
+        if not check_password(password, usuari_data['contrasenya']):
+            return jsonify({
+                'error': 'Contrasenya actual incorrecta',
+                'status': 'error'
+            }), 401
+        
+        # 3. Actualiza el nombre en la base de datos
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            cursor.execute(
+                "UPDATE usuari SET nom_usuari = %s WHERE id = %s",
+                (nou_nom, usuari_data['id'])
+            )
+            cnx.commit()
+        # El nombre antiguo ya no apunta a este usuario
+        usuaris.invalidate_user(nom=usuari, user=usuari_data['id'])
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Nom actualitzat correctament'
+        }), 200
                 
+    except PasswordPoolBusy:
+        return servidor_ocupat()
     except Exception as e:
-        print(f"Error: {e}")
-        if cnx.is_connected():
-            cnx.rollback()  # Revertir cambios en caso de error
+        print(f"Error: {e}")  # El pool revierte los cambios pendientes al devolver la conexión
         return jsonify({
             'error': str(e),
             'status': 'error'
         }), 500
-    finally:
-        if cnx.is_connected():
-            cnx.close()
 
 @api.route('/foro/nou_missatge', methods=['POST'])  
 def afegir_nou_missatge():
     data = request.get_json()
     
     # Validación de datos recibidos
-    if not data or 'id_user' not in data or 'mensaje' not in data:
+    if not data or ('id_user' not in data and not g.user_id) or 'mensaje' not in data:
         return jsonify({
             'error': 'Falta el nom d\'usuari o el missatge',
             'status': 'error'
         }), 400
-    id_user = data['id_user']
+    id_user = data.get('id_user')
     mensaje = data['mensaje']
-    cnx = databaseconnection()
     try:
-        if cnx.is_connected():
+        with db_connection() as cnx:
             with cnx.cursor(dictionary=True) as cursor:     
-                cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (id_user,))
-                id_user = cursor.fetchone()
-                id_user = id_user['id']
+                id_user = usuari_actual(cnx, id_user)
+                if not id_user:
+                    return jsonify({'error': 'Usuari no trobat', 'status': 'error'}), 404
                 cursor.execute("INSERT INTO foro(id_user,mensaje) VALUES(%s,%s)", (id_user, mensaje))
                 cnx.commit()
                 return jsonify({
@@ -704,23 +1018,47 @@ def afegir_nou_missatge():
         print(f"Error: {e}")
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
+MIDA_PAGINA_FORO = 50  # Mensajes del foro por página
+MIDA_PAGINA_FORO_MAXIMA = 200  # Máximo de mensajes que puede pedir el cliente
+
 @api.route('/foro/mostrar_missatges', methods=['GET'])
 def mostrar_missatges():
+    """Devuelve una página de mensajes del foro (los más recientes primero).
+
+    Parámetros: cursor (id del último mensaje recibido), limit y ordre ('desc' o 'asc').
+    """
     try:
-        cnx = databaseconnection()
-        with cnx.cursor(dictionary=True) as cursor:
-            # Obtiene todos los mensajes del foro
-            cursor.execute("SELECT id_user, mensaje FROM foro")
+        cursor_id = arg_enter('cursor')
+        limit = arg_enter('limit', MIDA_PAGINA_FORO, 1, MIDA_PAGINA_FORO_MAXIMA)
+    except ValueError:
+        return jsonify({'error': 'El cursor i el límit han de ser números', 'status': 'error'}), 400
+    ascendent = request.args.get('ordre', 'desc') == 'asc'
+
+    try:
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            # Una sola consulta con el nombre del autor; paginación por id (keyset)
+            condicio = ''
+            params = []
+            if cursor_id is not None:
+                condicio = 'WHERE f.id > %s' if ascendent else 'WHERE f.id < %s'
+                params.append(cursor_id)
+            cursor.execute(f"""
+                SELECT f.id, f.id_user, f.mensaje,
+                       COALESCE(u.nom_usuari, 'Desconegut') AS nom_usuari
+                FROM foro f
+                LEFT JOIN usuari u ON u.id = f.id_user
+                {condicio}
+                ORDER BY f.id {'ASC' if ascendent else 'DESC'}
+                LIMIT %s
+            """, (*params, limit + 1))
             missatges = cursor.fetchall()
-            for missatge in missatges:
-                # Obtiene el nombre del usuario
-                cursor.execute("SELECT nom_usuari FROM usuari WHERE id = %s", (missatge['id_user'],))
-                user = cursor.fetchone()
-                if user:
-                    missatge['nom_usuari'] = user['nom_usuari']
-                else:
-                    missatge['nom_usuari'] = 'Desconegut'
-            return jsonify(missatges), 200
+
+            # Si hay un mensaje de más, queda otra página por pedir
+            next_cursor = None
+            if len(missatges) > limit:
+                missatges = missatges[:limit]
+                next_cursor = missatges[-1]['id']
+            return jsonify({'missatges': missatges, 'next_cursor': next_cursor}), 200
     except mysql.connector.Error as err:
         if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
             print(err)
@@ -738,22 +1076,22 @@ def mostrar_missatges():
 @api.route('/eventos/crear', methods=['POST'])
 def crear_evento():
     try:
-        cnx = databaseconnection()
         data = request.get_json()
         # Validar datos requeridos
-        if not all(key in data for key in ['creador', 'titulo', 'fecha_evento', 'localizacion']):
+        if not all(key in data for key in ['titulo', 'fecha_evento', 'localizacion']) or ('creador' not in data and not g.user_id):
             return jsonify({'error': 'Faltan campos obligatorios', 'status': 'error'}), 400
         
-        with cnx.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (data['creador'],))
-            id_user = cursor.fetchone()
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            id_user = usuari_actual(cnx, data.get('creador'))
+            if not id_user:
+                return jsonify({'error': 'Usuario no encontrado', 'status': 'error'}), 404
             query = """
                 INSERT INTO eventos 
                 (id_creador, titulo, descripcion, fecha_evento, localizacion)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s)
             """
             cursor.execute(query, (
-                id_user['id'],
+                id_user,
                 data['titulo'],
                 data.get('descripcion'),
                 data['fecha_evento'],
@@ -776,30 +1114,90 @@ def crear_evento():
         print(f"Error: {e}")
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
+MIDA_PAGINA_EVENTOS = 100  # Eventos por página
+MIDA_PAGINA_EVENTOS_MAXIMA = 500  # Máximo de eventos que puede pedir el cliente
+
 @api.route('/eventos/mostrar', methods=['GET'])
 def mostrar_eventos():
+    """Lista eventos con sus participantes.
+
+    Filtros: proximos (solo futuros; es el valor por defecto si no se indica
+    desde ni hasta, proximos=0 lista también los pasados), desde / hasta
+    (fechas ISO), localizacion. Paginación: limit y offset.
+    participantes=recuento devuelve solo el número.
+    """
     try:
-        cnx = databaseconnection()
-        with cnx.cursor(dictionary=True) as cursor:
-            # Obtiene todos los eventos
-            cursor.execute("""
+        limit = arg_enter('limit', MIDA_PAGINA_EVENTOS, 1, MIDA_PAGINA_EVENTOS_MAXIMA)
+        offset = arg_enter('offset', 0, 0)
+        desde = request.args.get('desde')
+        hasta = request.args.get('hasta')
+        desde = datetime.fromisoformat(desde) if desde else None
+        hasta = datetime.fromisoformat(hasta) if hasta else None
+    except ValueError:
+        return jsonify({'error': 'Parámetros de paginación o fechas no válidos', 'status': 'error'}), 400
+    solo_recuento = request.args.get('participantes') == 'recuento'
+
+    # Construye los filtros de la consulta
+    condiciones = []
+    params = []
+    # Sin filtro de fechas se listan los próximos: los primeros por fecha serían los más antiguos
+    if request.args.get('proximos', '0' if (desde or hasta) else '1') == '1':
+        condiciones.append("e.fecha_evento >= NOW()")
+    if desde:
+        condiciones.append("e.fecha_evento >= %s")
+        params.append(desde)
+    if hasta:
+        condiciones.append("e.fecha_evento <= %s")
+        params.append(hasta)
+    if request.args.get('localizacion'):
+        condiciones.append("e.localizacion LIKE %s")
+        params.append(f"%{request.args['localizacion']}%")
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+
+    try:
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            # Obtiene una página de eventos
+            cursor.execute(f"""
                 SELECT e.*, u.nom_usuari as creador_nombre 
                 FROM eventos e
                 JOIN usuari u ON e.id_creador = u.id
-            """)
+                {where}
+                ORDER BY e.fecha_evento, e.id_evento
+                LIMIT %s OFFSET %s
+            """, (*params, limit, offset))
             eventos = cursor.fetchall()
-            
-            # Para cada evento, obtener participantes
+            ids = [evento['id_evento'] for evento in eventos]
+
+            # Participantes de todos los eventos de la página en una sola consulta
+            participantes = {id_evento: [] for id_evento in ids}
+            recuentos = dict.fromkeys(ids, 0)
+            if ids:
+                marcadores = ', '.join(['%s'] * len(ids))
+                if solo_recuento:
+                    cursor.execute(f"""
+                        SELECT id_evento, COUNT(*) AS total
+                        FROM evento_participantes
+                        WHERE id_evento IN ({marcadores})
+                        GROUP BY id_evento
+                    """, ids)
+                    for fila in cursor.fetchall():
+                        recuentos[fila['id_evento']] = fila['total']
+                else:
+                    cursor.execute(f"""
+                        SELECT ep.id_evento, u.id, u.nom_usuari 
+                        FROM evento_participantes ep
+                        JOIN usuari u ON ep.id_usuario = u.id
+                        WHERE ep.id_evento IN ({marcadores})
+                    """, ids)
+                    for fila in cursor.fetchall():
+                        participantes[fila.pop('id_evento')].append(fila)
+
             for evento in eventos:
-                cursor.execute("""
-                    SELECT u.id, u.nom_usuari 
-                    FROM evento_participantes ep
-                    JOIN usuari u ON ep.id_usuario = u.id
-                    WHERE ep.id_evento = %s
-                """, (evento['id_evento'],))
-                participantes = cursor.fetchall()
-                evento['participantes'] = participantes
-                evento['fecha_evento'] = evento['fecha_evento'].strftime('%Y-%m-%d %H:%M:%S')  # Formatear la fecha
+                if solo_recuento:
+                    evento['num_participantes'] = recuentos[evento['id_evento']]
+                else:
+                    evento['participantes'] = participantes[evento['id_evento']]
+                    evento['num_participantes'] = len(evento['participantes'])
             return jsonify(eventos), 200
             
     except mysql.connector.Error as err:
@@ -819,22 +1217,22 @@ def mostrar_eventos():
 @api.route('/eventos/unirse', methods=['POST'])
 def unirse_evento():
     try:
-        cnx = databaseconnection()
         data = request.get_json()
         print(data)
         # Validar datos requeridos
-        if not all(key in data for key in ['id_evento', 'usuario']):
+        if 'id_evento' not in data or ('usuario' not in data and not g.user_id):
             return jsonify({'error': 'Faltan campos obligatorios', 'status': 'error'}), 400
             
-        with cnx.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id FROM usuari WHERE nom_usuari= %s", (data['usuario'],))
-            id_user = cursor.fetchone()
+        with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+            id_user = usuari_actual(cnx, data.get('usuario'))
+            if not id_user:
+                return jsonify({'error': 'Usuario no encontrado', 'status': 'error'}), 404
             
             # Verificar si el usuario ya está registrado
             cursor.execute("""
                 SELECT 1 FROM evento_participantes 
                 WHERE id_evento = %s AND id_usuario = %s
-            """, (data['id_evento'], id_user['id']))
+            """, (data['id_evento'], id_user))
             if cursor.fetchone():
                 
                 return jsonify({'error': 'Ya estás registrado en este evento', 'status': 'error'}), 400
@@ -844,7 +1242,7 @@ def unirse_evento():
                 INSERT INTO evento_participantes 
                 (id_evento, id_usuario)
                 VALUES (%s, %s)
-            """, (data['id_evento'], id_user['id']))
+            """, (data['id_evento'], id_user))
             cnx.commit()
             return jsonify({'message': 'Te has unido al evento correctamente', 'status': 'success'}), 201
             
@@ -862,20 +1260,28 @@ def unirse_evento():
         print(f"Error: {e}")
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
-    
-def databaseconnection():  # Función para conectarse a la base de datosx
-    try:
-        # Establece la conexión con la base de datos
-        cnx = mysql.connector.connect(user='root', password='', database='la_trobada')
-        return cnx  # Retorna la conexión establecida
-    except mysql.connector.Error as err:  # Captura errores de conexión
-        if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:  # Verifica si el error es de acceso denegado
-            print("Incorrect user")
-            cnx.close()  # Cierra la conexión
-        elif err.errno == errorcode.ER_BAD_DB_ERROR:  # Verifica si el error es que la base de datos no existe
-            print("database doesn't exist")
-            cnx.close()  # Cierra la conexión
-        else:
-            print(err)  # Imprime cualquier otro error
-            cnx.close()  # Cierra la conexión
+@api.route('/estat/pool', methods=['GET'])
+def estat_pool():
+    """Devuelve las estadísticas del pool de conexiones a la base de datos"""
+    return jsonify(pool_stats()), 200
+
+@api.route('/estat/cache', methods=['GET'])
+def estat_cache():
+    """Devuelve los aciertos y fallos de las cachés de la aplicación"""
+    return jsonify(cache_stats()), 200
+
+@api.route('/estat/contrasenyes', methods=['GET'])
+def estat_contrasenyes():
+    """Devuelve la latencia de bcrypt y la espera en la cola de hilos"""
+    return jsonify(password_stats()), 200
+
+@api.route('/token/renovar', methods=['POST'])
+@token_required
+def renovar_token():
+    """Devuelve un token nuevo para el usuario del token actual"""
+    return jsonify({'token': issue_token(g.user_id), 'status': 'success'}), 200
 
+@api.route('/estat/xat', methods=['GET'])
+def estat_xat():
+    """Devuelve el estado de la cola de mensajes del chat pendientes de guardar"""
+    return jsonify(message_writer.stats()), 200
@@ -0,0 +1,106 @@
+import json  # Codificador estándar (alternativa si no hay orjson)
+import datetime
+import decimal
+import itertools
+from flask import Response
+from flask.json.provider import JSONProvider  # Punto de extensión de Flask para (de)serializar JSON
+from app.db import db_connection  # Pool de conexiones a la base de datos
+
+try:
+    import orjson  # Codificador en C, mucho más rápido con listas grandes
+except ImportError:  # orjson es opcional
+    orjson = None
+
+MIDA_LOT_STREAM = 500  # Filas que se leen de MySQL de cada vez al enviar en streaming
+
+
+def _default(obj):
+    # Tipos que devuelve mysql-connector y que el JSON no conoce
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)  # Como Flask: sin perder precisión
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()  # Columnas TIME
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8')
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """Serializa obj a JSON (bytes UTF-8) con orjson si está disponible."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(JSONProvider):
+    """Proveedor JSON de la app: orjson si está instalado y fechas en ISO 8601.
+
+    Las fechas se serializan siempre como isoformat() (también con el
+    codificador estándar) y los Decimal como texto.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Llamadas con opciones propias (p. ej. la cookie de sesión): json estándar
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Evita pasar por str: los bytes de orjson van directos a la respuesta
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def query_rows(query, params=(), batch=MIDA_LOT_STREAM):
+    """Generador de filas (dict) de una consulta, leídas con fetchmany.
+
+    Usa su propia conexión del pool, que se devuelve al terminar de recorrerlo
+    o al cerrarlo; el cursor no guarda el resultado entero en memoria.
+    """
+    with db_connection() as cnx, cnx.cursor(dictionary=True) as cursor:
+        cursor.execute(query, params)
+        acabat = False
+        try:
+            while True:
+                files = cursor.fetchmany(batch)
+                if not files:
+                    acabat = True
+                    break
+                yield from files
+        finally:
+            if not acabat:
+                # Cliente desconectado a medias: descarta el resto para poder cerrar el cursor
+                cnx.consume_results()
+
+
+def stream_json_array(rows, primeres=(), status=200):
+    """Respuesta con un array JSON que se genera fila a fila.
+
+    La memoria no depende del número de filas: cada elemento se serializa
+    y se envía en cuanto sale del cursor. `primeres` son filas ya leídas del
+    generador (p. ej. para comprobar que no está vacío) que van delante.
+    """
+    def generate():
+        primer = True
+        try:
+            for fila in itertools.chain(primeres, rows):
+                yield (b'[' if primer else b',') + dumps_bytes(fila)
+                primer = False
+            yield b'[]' if primer else b']'
+        finally:
+            close = getattr(rows, 'close', None)
+            if close:
+                close()  # Devuelve la conexión aunque el cliente corte la descarga
+    return Response(generate(), status=status, mimetype='application/json')
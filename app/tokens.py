@@ -0,0 +1,76 @@
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired  # Firma HMAC con caducidad
+
+SALT = 'la-trobada-sessio'  # Separa estas firmas de otros usos de SECRET_KEY
+CLAUS_PER_DEFECTE = {None, '', 'x'}  # Claves públicas: con ellas cualquiera podría firmar un token
+
+
+def tokens_enabled(config):
+    """Los tokens solo se emiten y aceptan con una SECRET_KEY propia."""
+    return config.get('SECRET_KEY') not in CLAUS_PER_DEFECTE
+
+
+def check_secret_key(app):
+    # Aviso al arrancar: sin SECRET_KEY los tokens quedan desactivados
+    if not tokens_enabled(app.config):
+        print("AVÍS: SECRET_KEY no està definida (o és la de per defecte); "
+              "els tokens de sessió estan desactivats fins que es defineixi", flush=True)
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SALT)
+
+
+def issue_token(user_id):
+    """Genera un token firmado (HMAC) que identifica al usuario (None si los tokens están desactivados)."""
+    if not tokens_enabled(current_app.config):
+        return None
+    return _serializer().dumps({'id': user_id})
+
+
+def verify_token(token):
+    """Devuelve el id del usuario del token, o None si la firma no es válida o ha caducado."""
+    if not tokens_enabled(current_app.config):
+        return None  # Con la clave por defecto la firma no demuestra nada
+    try:
+        payload = _serializer().loads(token, max_age=current_app.config['TOKEN_MAX_AGE'])
+    except (BadSignature, SignatureExpired):
+        return None
+    return payload.get('id')
+
+
+def bearer_token():
+    # Lee el token de la cabecera "Authorization: Bearer <token>"
+    cabecera = request.headers.get('Authorization', '')
+    if cabecera.startswith('Bearer '):
+        return cabecera[len('Bearer '):].strip() or None
+    return None
+
+
+def load_token_user():
+    """before_request: si la petición trae token, deja el id del usuario en g.user_id.
+
+    Las peticiones sin token siguen funcionando; un token inválido se rechaza.
+    """
+    g.user_id = None
+    token = bearer_token()
+    if token is None:
+        return None
+    g.user_id = verify_token(token)
+    if g.user_id is None:
+        return jsonify({'error': 'Token no vàlid o caducat', 'status': 'error'}), 401
+    return None
+
+
+def token_required(func):
+    """Decorador para rutas que solo aceptan peticiones con un token válido."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if g.get('user_id') is None:
+            token = bearer_token()
+            g.user_id = verify_token(token) if token else None
+        if g.user_id is None:
+            return jsonify({'error': 'Cal iniciar sessió', 'status': 'error'}), 401
+        return func(*args, **kwargs)
+    return wrapper
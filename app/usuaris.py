@@ -0,0 +1,73 @@
+from app.cache import TTLCache  # Caché LRU con caducidad
+
+# nom_usuari -> id y id -> nom_usuari (se configuran en create_app).
+# Los nombres se guardan en minúsculas porque MySQL los compara sin distinguir mayúsculas.
+ids_usuaris = TTLCache('ids_usuaris', maxsize=10000, ttl=600)
+noms_usuaris = TTLCache('noms_usuaris', maxsize=10000, ttl=600)
+
+
+def _remember(user_id, nom):
+    ids_usuaris.set(nom.lower(), user_id)
+    noms_usuaris.set(user_id, nom)
+
+
+def user_id(cnx, nom):
+    """Devuelve el id del usuario con ese nombre (None si no existe), usando la caché."""
+    if nom is None:
+        return None
+    user = ids_usuaris.get(nom.lower())
+    if user is not None:
+        return user
+    with cnx.cursor() as cursor:
+        cursor.execute("SELECT id, nom_usuari FROM usuari WHERE nom_usuari= %s", (nom,))
+        fila = cursor.fetchone()
+    if not fila:
+        return None  # Los usuarios inexistentes no se guardan: podrían registrarse después
+    _remember(fila[0], fila[1])
+    return fila[0]
+
+
+def user_ids(cnx, noms):
+    """Resuelve varios nombres a la vez: {nom: id} solo con los que existen."""
+    resultat = {}
+    pendents = {}  # nombre en minúsculas -> nombre tal como lo ha pedido el cliente
+    for nom in dict.fromkeys(noms):
+        if nom is None:
+            continue
+        user = ids_usuaris.get(nom.lower())
+        if user is not None:
+            resultat[nom] = user
+        else:
+            pendents[nom.lower()] = nom
+    if pendents:
+        marcadors = ', '.join(['%s'] * len(pendents))
+        with cnx.cursor() as cursor:
+            cursor.execute(f"SELECT id, nom_usuari FROM usuari WHERE nom_usuari IN ({marcadors})",
+                           list(pendents.values()))
+            for user, nom in cursor.fetchall():
+                _remember(user, nom)
+                if nom.lower() in pendents:
+                    resultat[pendents[nom.lower()]] = user
+    return resultat
+
+
+def user_name(cnx, user):
+    """Devuelve el nombre del usuario con ese id (None si no existe), usando la caché."""
+    nom = noms_usuaris.get(user)
+    if nom is not None:
+        return nom
+    with cnx.cursor() as cursor:
+        cursor.execute("SELECT nom_usuari FROM usuari WHERE id = %s", (user,))
+        fila = cursor.fetchone()
+    if not fila:
+        return None
+    _remember(user, fila[0])
+    return fila[0]
+
+
+def invalidate_user(nom=None, user=None):
+    """Olvida un usuario de las cachés (p. ej. al cambiarle el nombre)."""
+    if nom is not None:
+        ids_usuaris.invalidate(nom.lower())
+    if user is not None:
+        noms_usuaris.invalidate(user)
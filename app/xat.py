@@ -0,0 +1,299 @@
+import time  # Para los intervalos de volcado y reintentos
+import queue  # Con eventlet.monkey_patch() la cola pasa a ser "verde"
+import signal  # Para guardar los mensajes pendientes al recibir SIGTERM/SIGINT
+import threading
+import eventlet
+import greenlet
+from mysql.connector import DataError, IntegrityError  # Errores de una fila concreta (no de conexión)
+from app.db import db_connection  # Pool de conexiones a la base de datos
+from app.cache import TTLCache  # Caché LRU con caducidad
+
+# (usuari_min, usuari_max) -> id_conversacion (se configura en create_app)
+converses = TTLCache('converses', maxsize=10000, ttl=3600)
+# id_conversacion -> (usuari_min, usuari_max), para validar los mensajes sin ir a la base de datos
+participants = TTLCache('participants_conversa', maxsize=10000, ttl=3600)
+
+MAX_BYTES_MISSATGE = 65535  # Tamaño máximo de la columna mensaje (TEXT)
+
+INSERT_MISSATGES = """
+    INSERT INTO mensajes_privados (id_conversacion, id_remitente, mensaje, fecha_envio)
+    VALUES (%s, %s, %s, %s)
+"""
+
+
+def parella(usuari1, usuari2):
+    """Representación canónica de una conversación: los dos ids ordenados."""
+    usuari1, usuari2 = int(usuari1), int(usuari2)
+    return (usuari1, usuari2) if usuari1 <= usuari2 else (usuari2, usuari1)
+
+
+def conversation_id(cnx, usuari1, usuari2):
+    """Devuelve el id de la conversación entre dos usuarios (None si no existe), usando la caché."""
+    clau = parella(usuari1, usuari2)
+    id_conversacion = converses.get(clau)
+    if id_conversacion is not None:
+        return id_conversacion
+    with cnx.cursor() as cursor:
+        # Una sola búsqueda en el índice único (usuari_min, usuari_max)
+        cursor.execute("""
+            SELECT id_conversacion FROM conversaciones
+            WHERE usuari_min = %s AND usuari_max = %s
+        """, clau)
+        fila = cursor.fetchone()
+    if not fila:
+        return None  # Las conversaciones inexistentes no se guardan: se pueden crear después
+    converses.set(clau, fila[0])
+    participants.set(fila[0], clau)
+    return fila[0]
+
+
+def conversation_members(cnx, id_conversacion):
+    """Devuelve (usuari_min, usuari_max) de una conversación (None si no existe), usando la caché."""
+    membres = participants.get(id_conversacion)
+    if membres is not None:
+        return membres
+    with cnx.cursor() as cursor:
+        cursor.execute("SELECT usuari_min, usuari_max FROM conversaciones WHERE id_conversacion = %s",
+                       (id_conversacion,))
+        fila = cursor.fetchone()
+    if not fila:
+        return None
+    membres = (fila[0], fila[1])
+    participants.set(id_conversacion, membres)
+    converses.set(membres, id_conversacion)
+    return membres
+
+
+def check_message(cnx, id_conversacion, id_remitente, mensaje):
+    """Comprueba que un mensaje se puede guardar antes de encolarlo o insertarlo.
+
+    Devuelve (id_conversacion, id_remitente) como enteros; lanza ValueError si
+    los ids no son válidos, el remitente no es de la conversación o el texto no cabe.
+    """
+    try:
+        id_conversacion, id_remitente = int(id_conversacion), int(id_remitente)
+    except (TypeError, ValueError):
+        raise ValueError('Conversa o remitent no vàlids')
+    if not isinstance(mensaje, str) or not mensaje:
+        raise ValueError('El missatge és buit')
+    if len(mensaje.encode('utf-8')) > MAX_BYTES_MISSATGE:
+        raise ValueError('El missatge és massa llarg')
+    membres = conversation_members(cnx, id_conversacion)
+    if membres is None:
+        raise ValueError('La conversa no existeix')
+    if id_remitente not in membres:
+        raise ValueError('El remitent no és de la conversa')
+    return id_conversacion, id_remitente
+
+
+def create_conversation(cnx, usuari1, usuari2):
+    """Crea la conversación y la guarda en la caché. Lanza IntegrityError si ya existe."""
+    with cnx.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO conversaciones (id_usuario1, id_usuario2) 
+            VALUES (%s, %s)
+        """, (usuari1, usuari2))
+        id_conversacion = cursor.lastrowid
+    cnx.commit()
+    converses.set(parella(usuari1, usuari2), id_conversacion)
+    participants.set(id_conversacion, parella(usuari1, usuari2))
+    return id_conversacion
+
+
+def update_summaries(cursor, ids_conversacion):
+    """Copia el último mensaje de cada conversación a su resumen (bandeja de entrada).
+
+    Se llama después de guardar mensajes, tanto uno a uno como por lotes;
+    MAX(id) usa el índice (id_conversacion, id).
+    """
+    ids_conversacion = sorted(set(ids_conversacion))
+    if not ids_conversacion:
+        return
+    marcadors = ', '.join(['%s'] * len(ids_conversacion))
+    cursor.execute(f"""
+        UPDATE conversaciones c
+        JOIN (
+            SELECT id_conversacion, MAX(id) AS id
+            FROM mensajes_privados
+            WHERE id_conversacion IN ({marcadors})
+            GROUP BY id_conversacion
+        ) u ON u.id_conversacion = c.id_conversacion
+        JOIN mensajes_privados m ON m.id = u.id
+        SET c.ultimo_mensaje_id = m.id,
+            c.ultimo_mensaje = m.mensaje,
+            c.ultimo_remitente = m.id_remitente,
+            c.actividad = m.fecha_envio
+    """, ids_conversacion)
+
+
+def mark_read(cursor, id_conversacion, id_usuario, id_mensaje=None):
+    """Marca como leídos los mensajes hasta id_mensaje (por defecto, el último de la conversación)."""
+    if id_mensaje is None:
+        cursor.execute("""
+            INSERT INTO conversaciones_lectura (id_conversacion, id_usuario, ultimo_leido)
+            SELECT id_conversacion, %s, COALESCE(ultimo_mensaje_id, 0)
+            FROM conversaciones WHERE id_conversacion = %s
+            ON DUPLICATE KEY UPDATE ultimo_leido = GREATEST(ultimo_leido, VALUES(ultimo_leido))
+        """, (id_usuario, id_conversacion))
+    else:
+        # El puntero solo avanza: leer una página antigua no desmarca nada
+        cursor.execute("""
+            INSERT INTO conversaciones_lectura (id_conversacion, id_usuario, ultimo_leido)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE ultimo_leido = GREATEST(ultimo_leido, VALUES(ultimo_leido))
+        """, (id_conversacion, id_usuario, id_mensaje))
+
+
+class ChatQueueFull(Exception):
+    """La cola de mensajes pendientes de guardar sigue llena tras esperar."""
+
+
+class MessageWriter:
+    """Guarda los mensajes del chat en segundo plano (write-behind).
+
+    Los mensajes se encolan en orden de llegada y una única tarea los vuelca
+    con un INSERT de varias filas cada `interval` segundos o cada `max_batch`
+    mensajes. Al haber un solo escritor y reintentar el lote fallido antes
+    que los siguientes, el orden dentro de cada conversación se mantiene.
+    Solo se reintentan los errores de conexión: si el lote falla por los datos
+    de alguna fila, se guarda fila a fila y las que fallan se descartan.
+    """
+
+    def __init__(self, interval=0.05, max_batch=200, max_queue=5000, put_timeout=1.0):
+        self.enabled = False
+        self.interval = interval  # Segundos máximos que un mensaje espera a guardarse
+        self.max_batch = max_batch  # Mensajes por INSERT
+        self.put_timeout = put_timeout  # Espera máxima del remitente si la cola está llena
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = []  # Lote en curso (se reintenta hasta guardarlo)
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'encolats': 0, 'desats': 0, 'lots': 0, 'errors': 0, 'rebutjats': 0, 'descartats': 0}
+
+    def configure(self, enabled, interval, max_batch, max_queue, put_timeout):
+        self.enabled = enabled
+        self.interval = interval
+        self.max_batch = max_batch
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    def append(self, id_conversacion, id_remitente, mensaje, fecha_envio):
+        """Encola un mensaje; si la cola está llena espera (contrapresión) y después falla."""
+        if self._stop.is_set():
+            raise ChatQueueFull('El xat s\'està aturant')
+        try:
+            self._queue.put((id_conversacion, id_remitente, mensaje, fecha_envio), timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats['rebutjats'] += 1
+            raise ChatQueueFull('Massa missatges pendents de desar')
+        with self._lock:
+            self._stats['encolats'] += 1
+
+    def _take_batch(self, timeout):
+        # Completa el lote pendiente con lo que haya en la cola
+        if not self._pending:
+            try:
+                self._pending.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                return
+        while len(self._pending) < self.max_batch:
+            try:
+                self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def flush(self):
+        """Guarda el lote pendiente con un solo INSERT y un commit. Devuelve las filas guardadas."""
+        if not self._pending:
+            return 0
+        descartats = 0
+        with db_connection() as cnx, cnx.cursor() as cursor:
+            try:
+                cursor.executemany(INSERT_MISSATGES, self._pending)
+                files = self._pending
+            except (IntegrityError, DataError) as e:
+                # Alguna fila no es válida: se guardan una a una y se descartan las que fallan
+                print(f"Lot del xat rebutjat ({e}), es desa missatge a missatge")
+                cnx.rollback()
+                files = []
+                for fila in self._pending:
+                    try:
+                        cursor.execute(INSERT_MISSATGES, fila)
+                        files.append(fila)
+                    except (IntegrityError, DataError) as e:
+                        descartats += 1
+                        print(f"Missatge del xat descartat {fila[:2]}: {e}")
+            update_summaries(cursor, [fila[0] for fila in files])
+            cnx.commit()
+        desats = len(files)
+        self._pending = []
+        with self._lock:
+            self._stats['desats'] += desats
+            self._stats['descartats'] += descartats
+            self._stats['lots'] += 1
+        return desats
+
+    def run(self):
+        """Bucle de la tarea en segundo plano; termina cuando se llama a stop() y la cola está vacía."""
+        espera_error = self.interval
+        while not (self._stop.is_set() and self._queue.empty() and not self._pending):
+            inici = time.monotonic()
+            self._take_batch(self.interval)
+            # Deja acumular mensajes hasta completar el intervalo o el lote
+            restant = self.interval - (time.monotonic() - inici)
+            if self._pending and len(self._pending) < self.max_batch and restant > 0 and not self._stop.is_set():
+                time.sleep(restant)
+                self._take_batch(0)
+            try:
+                self.flush()
+                espera_error = self.interval
+            except Exception as e:
+                # Errores de conexión u operativos: el lote se reintenta sin perder el orden
+                with self._lock:
+                    self._stats['errors'] += 1
+                print(f"Error al desar missatges del xat: {e}")
+                time.sleep(espera_error)
+                espera_error = min(espera_error * 2, 5)
+        self._done.set()
+
+    def stop(self, timeout=10):
+        """Deja de aceptar mensajes y espera a que se guarden los pendientes."""
+        if not self.enabled:
+            return
+        self._stop.set()
+        self._done.wait(timeout)
+
+    def stop_on_signals(self, signals=(signal.SIGTERM, signal.SIGINT)):
+        """Guarda los mensajes pendientes antes de salir por una señal (atexit no se ejecuta con SIGTERM).
+
+        La señal puede llegar dentro del hub de eventlet, donde no se puede
+        esperar: el vaciado se hace en otro greenlet y después se lanza
+        SystemExit en el greenlet principal (el del servidor).
+        """
+        principal = greenlet.getcurrent()
+
+        def buidar(signum):
+            print(f"Senyal {signum}: es desen {self.stats()['pendents']} missatges pendents del xat", flush=True)
+            self.stop()
+            eventlet.kill(principal, SystemExit(0))
+
+        def aturar(signum, frame):
+            eventlet.spawn(buidar, signum)
+
+        for signum in signals:
+            try:
+                signal.signal(signum, aturar)
+            except ValueError:
+                return  # Fuera del hilo principal (p. ej. app creada en un test): solo queda atexit
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pendents'] = self._queue.qsize() + len(self._pending)
+        stats['actiu'] = self.enabled
+        return stats
+
+
+message_writer = MessageWriter()
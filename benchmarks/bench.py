@@ -0,0 +1,248 @@
+# Banco de pruebas reproducible: arranca create_app() contra una base de datos
+# MySQL/MariaDB local y una API de mtgsdk falsa, siembra datos y mide la latencia
+# (p50/p95/p99) y el rendimiento de cada endpoint y evento Socket.IO.
+#
+#   python -m benchmarks.bench --mysql-password secret --crea-esquema --perfil gran \
+#       --sortida resultats.json --compara anterior.json
+#
+# La base de datos indicada con --mysql-db se BORRA con --crea-esquema.
+import eventlet  # Importa eventlet antes de cualquier otra cosa, como run.py
+eventlet.monkey_patch()
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import time
+from datetime import datetime
+
+import mysql.connector
+from eventlet import GreenPool
+
+from app.config import Config
+from benchmarks import seed
+from benchmarks.fake_mtg_api import FakeMtgApi
+
+ARREL = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Escenarios -------------------------------------------------------------
+# Cada escenario recibe (client, ctx) y devuelve True si la respuesta es correcta.
+# client es un test_client de Flask o de Socket.IO (uno por greenthread).
+
+def _http(metode, url, esperat=200, **kwargs):
+    def escenari(client, ctx):
+        resposta = client.open(url.format(**ctx), method=metode, **{k: _format(v, ctx) for k, v in kwargs.items()})
+        resposta.get_data()  # Incluye el tiempo de generar respuestas en streaming
+        resposta.close()
+        return resposta.status_code == esperat
+    return escenari
+
+
+def _format(valor, ctx):
+    if isinstance(valor, dict):
+        return {k: _format(v, ctx) for k, v in valor.items()}
+    if isinstance(valor, str):
+        return valor.format(**ctx)
+    return valor
+
+
+def _socket(event, dades, resposta=None):
+    def escenari(client, ctx):
+        client.emit(event, _format(dades, ctx))
+        rebuts = client.get_received()
+        if any(r['name'] == 'error' for r in rebuts):
+            return False
+        return resposta is None or any(r['name'] == resposta for r in rebuts)
+    return escenari
+
+
+ESCENARIS = {
+    'GET /api/carta/coleccio/mostrar': ('http', _http('GET', '/api/carta/coleccio/mostrar', json={'id_col': '{id_coleccio}'})),
+    'GET /api/coleccio/mostrar': ('http', _http('GET', '/api/coleccio/mostrar', json={'usr': '{usuari}'})),
+    'GET /api/foro/mostrar_missatges': ('http', _http('GET', '/api/foro/mostrar_missatges?limit=50')),
+    'GET /api/chat/conversaciones': ('http', _http('GET', '/api/chat/conversaciones/{usuari}')),
+    'GET /api/chat/mensajes': ('http', _http('GET', '/api/chat/mensajes/{contacte}/{usuari}')),
+    'GET /api/eventos/mostrar': ('http', _http('GET', '/api/eventos/mostrar?limit=100')),
+    'GET /api/carta/autocomplete': ('http', _http('GET', '/api/carta/autocomplete?q=carta%20de%20prova%2012')),
+    'POST /api/carta/web': ('http', _http('POST', '/api/carta/web', json={'nom': 'Carta de prova 15'})),
+    'POST /api/login': ('http', _http('POST', '/api/login', json={'usuari': '{usuari}', 'contrasenya': seed.CONTRASENYA})),
+    'socketio unirse_a_conversacion': ('socketio', _socket('unirse_a_conversacion',
+                                                           {'usuario': '{contacte}', 'id_usuario': '{id_usuari}'},
+                                                           'unido_a_conversacion')),
+    'socketio enviar_mensaje': ('socketio', _socket('enviar_mensaje',
+                                                    {'id_conversacion': '{id_conversacion}', 'id_remitente': '{id_usuari}',
+                                                     'mensaje': 'Missatge de benchmark'})),
+}
+
+
+# --- Medida -----------------------------------------------------------------
+
+def percentile(valors, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not valors:
+        return 0.0
+    index = max(0, min(len(valors) - 1, math.ceil(p / 100 * len(valors)) - 1))
+    return valors[index]
+
+
+def summarize(latencies, errors, durada):
+    latencies = sorted(latencies)
+    n = len(latencies)
+    return {
+        'peticions': n,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mitjana_ms': (sum(latencies) / n * 1000) if n else 0.0,
+        'peticions_per_segon': n / durada if durada else 0.0,
+    }
+
+
+def run_scenario(app, socketio, tipus, escenari, ctx, iteracions, concurrencia, escalfament):
+    def nou_client():
+        return app.test_client() if tipus == 'http' else socketio.test_client(app)
+
+    client = nou_client()
+    for _ in range(escalfament):
+        escenari(client, ctx)
+
+    latencies = []
+    errors = 0
+
+    def treballador(n):
+        nonlocal errors
+        client = nou_client()
+        if tipus == 'socketio':
+            client.get_received()  # Descarta los mensajes de la conexión
+        for _ in range(n):
+            inici = time.perf_counter()
+            try:
+                correcte = escenari(client, ctx)
+            except Exception:
+                correcte = False
+            latencies.append(time.perf_counter() - inici)
+            if not correcte:
+                errors += 1
+        if tipus == 'socketio':
+            client.disconnect()
+
+    repartiment = [iteracions // concurrencia + (1 if i < iteracions % concurrencia else 0) for i in range(concurrencia)]
+    pool = GreenPool(concurrencia)
+    inici = time.perf_counter()
+    for n in repartiment:
+        if n:
+            pool.spawn(treballador, n)
+    pool.waitall()
+    return summarize(latencies, errors, time.perf_counter() - inici)
+
+
+# --- Informe ----------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ARREL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_table(resultats, anteriors=None):
+    capcalera = f"{'escenari':<36} {'n':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}"
+    if anteriors:
+        capcalera += f" {'Δp50':>8} {'Δp95':>8}"
+    print(capcalera)
+    print('-' * len(capcalera))
+    for nom, r in resultats.items():
+        linia = (f"{nom:<36} {r['peticions']:>6} {r['errors']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                 f"{r['p99_ms']:>9.2f} {r['peticions_per_segon']:>9.1f}")
+        anterior = (anteriors or {}).get(nom)
+        if anterior:
+            for clau in ('p50_ms', 'p95_ms'):
+                delta = (r[clau] - anterior[clau]) / anterior[clau] * 100 if anterior[clau] else 0.0
+                linia += f" {delta:>+7.1f}%"
+        print(linia)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de la API y del chat contra MySQL local y una API mtgsdk falsa')
+    parser.add_argument('--mysql-host', default='127.0.0.1')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-user', default='root')
+    parser.add_argument('--mysql-password', default='')
+    parser.add_argument('--mysql-db', default='la_trobada_bench')
+    parser.add_argument('--crea-esquema', action='store_true', help='Esborra i crea la base de dades i la sembra')
+    parser.add_argument('--perfil', choices=sorted(seed.PERFILS), default='petit', help='Volum de dades sembrades')
+    parser.add_argument('--iteracions', type=int, default=500, help='Peticions per escenari')
+    parser.add_argument('--concurrencia', type=int, default=10, help='Clients simultanis (greenthreads)')
+    parser.add_argument('--escalfament', type=int, default=20, help='Peticions no mesurades abans de cada escenari')
+    parser.add_argument('--escenaris', nargs='*', help='Només els escenaris que continguin aquests textos')
+    parser.add_argument('--latencia-api', type=float, default=0.0, help='Segons de latència de l\'API mtgsdk falsa')
+    parser.add_argument('--sortida', help='Desa els resultats en JSON')
+    parser.add_argument('--compara', help='JSON d\'una execució anterior per mostrar la diferència')
+    args = parser.parse_args()
+
+    # La API de cartas falsa: mtgsdk no sale nunca a internet
+    api = FakeMtgApi(total=seed.PERFILS[args.perfil]['cataleg'] * 2, latencia=args.latencia_api).start().install()
+
+    connect_args = {'host': args.mysql_host, 'port': args.mysql_port,
+                    'user': args.mysql_user, 'password': args.mysql_password}
+    if args.crea_esquema:
+        seed.create_schema(connect_args, args.mysql_db)
+        cnx = mysql.connector.connect(database=args.mysql_db, **connect_args)
+        try:
+            inici = time.perf_counter()
+            seed.seed(cnx, args.perfil)
+            print(f"Dades sembrades (perfil {args.perfil}) en {time.perf_counter() - inici:.1f} s")
+        finally:
+            cnx.close()
+
+    # La app usa la base de datos de benchmarks, sin tareas en segundo plano que añadan ruido
+    Config.MYSQL_HOST = args.mysql_host
+    Config.MYSQL_PORT = args.mysql_port
+    Config.MYSQL_USER = args.mysql_user
+    Config.MYSQL_PASSWORD = args.mysql_password
+    Config.MYSQL_DB = args.mysql_db
+    Config.MYSQL_POOL_SIZE = max(Config.MYSQL_POOL_SIZE, args.concurrencia)
+    Config.AUTOCOMPLETE_REFRESH_INTERVAL = 0
+
+    from app import create_app, socketio
+    from app.autocomplete import name_index
+    from app.db import db_connection
+    app = create_app()
+    name_index.load()
+    with db_connection() as cnx:
+        ctx = seed.context(cnx)
+
+    resultats = {}
+    for nom, (tipus, escenari) in ESCENARIS.items():
+        if args.escenaris and not any(filtre in nom for filtre in args.escenaris):
+            continue
+        resultats[nom] = run_scenario(app, socketio, tipus, escenari, ctx,
+                                      args.iteracions, args.concurrencia, args.escalfament)
+        print(f"{nom}: p50 {resultats[nom]['p50_ms']:.2f} ms, {resultats[nom]['peticions_per_segon']:.1f} req/s")
+    api.stop()
+
+    anteriors = None
+    if args.compara:
+        with open(args.compara, encoding='utf-8') as f:
+            anteriors = json.load(f)['resultats']
+    print()
+    print_table(resultats, anteriors)
+
+    if args.sortida:
+        with open(args.sortida, 'w', encoding='utf-8') as f:
+            json.dump({
+                'commit': git_commit(),
+                'data': datetime.now().isoformat(timespec='seconds'),
+                'perfil': args.perfil,
+                'iteracions': args.iteracions,
+                'concurrencia': args.concurrencia,
+                'resultats': resultats,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"Resultats desats a {args.sortida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+# Prueba de carga del chat: abre miles de clientes Socket.IO reales contra un
+# servidor local (uno de run.py) y mide la latencia de entrega de nuevo_mensaje,
+# los mensajes perdidos y la CPU/memoria del servidor, por etapas de clientes.
+#
+#   python -m benchmarks.chat_load --mysql-password secret --crea-esquema \
+#       --clients 100 500 1000 2000 --ritme 0.5 --durada 30 --sortida chat.json
+#
+# Los clientes necesitan el cliente de python-socketio con websocket
+# (pip install "python-socketio[client]"). La base de datos de --mysql-db se
+# BORRA con --crea-esquema. Con --url se usa un servidor ya arrancado (y
+# --pid para medir su CPU y memoria).
+import eventlet  # Importa eventlet antes de cualquier otra cosa, como run.py
+eventlet.monkey_patch()
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+import socketio
+from itsdangerous import URLSafeTimedSerializer
+
+from app.config import Config
+from app.tokens import SALT
+from benchmarks import seed
+from benchmarks.bench import git_commit, percentile
+
+PREFIX_USUARI = 'carrega'  # Usuarios carrega0..carregaN, emparejados (0-1, 2-3, ...)
+
+
+# --- Servidor ---------------------------------------------------------------
+
+def configure(args):
+    Config.MYSQL_HOST = args.mysql_host
+    Config.MYSQL_PORT = args.mysql_port
+    Config.MYSQL_USER = args.mysql_user
+    Config.MYSQL_PASSWORD = args.mysql_password
+    Config.MYSQL_DB = args.mysql_db
+    Config.AUTOCOMPLETE_REFRESH_INTERVAL = 0
+    Config.CHAT_WRITE_BEHIND = args.write_behind
+
+
+def run_server(args):
+    # Igual que run.py pero sin modo debug (sin recargador ni proceso hijo)
+    configure(args)
+    from app import create_app, socketio as servidor
+    app = create_app()
+    servidor.run(app, host='127.0.0.1', port=args.port, log_output=False)
+
+
+def start_server(args):
+    ordre = [sys.executable, '-m', 'benchmarks.chat_load', '--servidor', '--port', str(args.port),
+             '--mysql-host', args.mysql_host, '--mysql-port', str(args.mysql_port),
+             '--mysql-user', args.mysql_user, '--mysql-password', args.mysql_password,
+             '--mysql-db', args.mysql_db]
+    if args.write_behind:
+        ordre.append('--write-behind')
+    proces = subprocess.Popen(ordre, cwd=seed.ARREL)
+    url = f'http://127.0.0.1:{args.port}'
+    # Espera a que el servidor acepte conexiones
+    limit = time.monotonic() + 30
+    while time.monotonic() < limit:
+        try:
+            eventlet.connect(('127.0.0.1', args.port)).close()
+            return proces, url
+        except OSError:
+            if proces.poll() is not None:
+                raise RuntimeError('El servidor no ha arrencat')
+            time.sleep(0.2)
+    proces.terminate()
+    raise RuntimeError('El servidor no respon')
+
+
+# --- CPU y memoria del servidor (Linux: /proc) ------------------------------
+
+class ProcessSampler:
+    """Muestrea cada `interval` segundos la CPU (%) y la memoria residente (MB) de un proceso."""
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.mostres = []
+        self._stop = threading.Event()
+
+    def _cpu_ticks(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            camps = f.read().rsplit(')', 1)[1].split()
+        return int(camps[11]) + int(camps[12])  # utime + stime
+
+    def _rss_mb(self):
+        with open(f'/proc/{self.pid}/status') as f:
+            for linia in f:
+                if linia.startswith('VmRSS:'):
+                    return int(linia.split()[1]) / 1024
+        return 0.0
+
+    def run(self):
+        ticks_per_segon = os.sysconf('SC_CLK_TCK')
+        try:
+            anterior, temps = self._cpu_ticks(), time.monotonic()
+            while not self._stop.wait(self.interval):
+                ticks, ara = self._cpu_ticks(), time.monotonic()
+                cpu = (ticks - anterior) / ticks_per_segon / (ara - temps) * 100
+                self.mostres.append((cpu, self._rss_mb()))
+                anterior, temps = ticks, ara
+        except (OSError, ValueError):
+            pass  # Proceso terminado o sin /proc
+
+    def start(self):
+        self.mostres = []
+        self._stop.clear()
+        eventlet.spawn(self.run)
+
+    def stop(self):
+        self._stop.set()
+        cpus = [cpu for cpu, _ in self.mostres]
+        rss = [mb for _, mb in self.mostres]
+        return {
+            'cpu_mitjana_pct': sum(cpus) / len(cpus) if cpus else None,
+            'cpu_max_pct': max(cpus) if cpus else None,
+            'rss_max_mb': max(rss) if rss else None,
+        }
+
+
+# --- Datos ------------------------------------------------------------------
+
+def seed_pairs(cnx, clients):
+    """Crea (si faltan) los usuarios de carga y una conversación por pareja. Devuelve [(id, nom)]."""
+    noms = [f'{PREFIX_USUARI}{i}' for i in range(clients)]
+    with cnx.cursor() as cursor:
+        cursor.executemany("""
+            INSERT IGNORE INTO usuari (nom_usuari, correu, contrasenya) VALUES (%s, %s, %s)
+        """, [(nom, f'{nom}@example.com', '-') for nom in noms])
+        cursor.execute("SELECT nom_usuari, id FROM usuari WHERE nom_usuari LIKE %s", (f'{PREFIX_USUARI}%',))
+        ids = dict(cursor.fetchall())
+        cursor.executemany("""
+            INSERT IGNORE INTO conversaciones (id_usuario1, id_usuario2) VALUES (%s, %s)
+        """, [(ids[noms[i]], ids[noms[i + 1]]) for i in range(0, clients - 1, 2)])
+    cnx.commit()
+    return [(ids[nom], nom) for nom in noms]
+
+
+# --- Clientes ---------------------------------------------------------------
+
+class ChatClient:
+    """Un usuario: se conecta con token, se une a la conversación con su pareja y envía mensajes."""
+
+    def __init__(self, url, token, id_usuari, nom_parella, estadistiques):
+        self.url = url
+        self.token = token
+        self.id_usuari = id_usuari
+        self.nom_parella = nom_parella
+        self.stats = estadistiques
+        self.id_conversacion = None
+        self.unit = threading.Event()
+        self.sio = socketio.Client(reconnection=False, handle_sigint=False)
+        self.sio.on('unido_a_conversacion', self._unit)
+        self.sio.on('nuevo_mensaje', self._nou_missatge)
+        self.sio.on('error', self._error)
+
+    def _unit(self, dades):
+        self.id_conversacion = dades['id_conversacion']
+        self.unit.set()
+
+    def _nou_missatge(self, dades):
+        # El texto lleva "<remitente>|<secuencia>|<hora de envío>"
+        arribada = time.time()
+        remitent, sequencia, enviat = dades['mensaje'].split('|')
+        self.stats.rebut(int(remitent), int(sequencia), arribada - float(enviat))
+
+    def _error(self, dades):
+        self.stats.errors += 1
+
+    def connect(self):
+        self.sio.connect(self.url, auth={'token': self.token}, transports=['websocket'], wait_timeout=10)
+        self.sio.emit('unirse_a_conversacion', {'usuario': self.nom_parella, 'id_usuario': self.id_usuari})
+        if not self.unit.wait(10):
+            raise RuntimeError('Sense resposta a unirse_a_conversacion')
+
+    def send(self, sequencia):
+        self.sio.emit('enviar_mensaje', {
+            'id_conversacion': self.id_conversacion,
+            'id_remitente': self.id_usuari,
+            'mensaje': f'{self.id_usuari}|{sequencia}|{time.time()!r}',
+        })
+        self.stats.enviat(self.id_usuari, sequencia)
+
+    def close(self):
+        try:
+            if self.id_conversacion is not None:
+                self.sio.emit('salir_de_conversacion', {'id_conversacion': self.id_conversacion})
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+class StageStats:
+    """Mensajes enviados y recibidos de una etapa."""
+
+    def __init__(self):
+        self.enviats = {}  # remitente -> secuencias enviadas
+        self.rebuts = {}  # remitente -> secuencias recibidas por su pareja
+        self.latencies = []
+        self.errors = 0
+
+    def enviat(self, remitent, sequencia):
+        self.enviats.setdefault(remitent, set()).add(sequencia)
+
+    def rebut(self, remitent, sequencia, latencia):
+        self.rebuts.setdefault(remitent, set()).add(sequencia)
+        self.latencies.append(latencia)
+
+    def summary(self):
+        enviats = sum(len(s) for s in self.enviats.values())
+        perduts = sum(len(s - self.rebuts.get(r, set())) for r, s in self.enviats.items())
+        latencies = sorted(self.latencies)
+        return {
+            'missatges_enviats': enviats,
+            'missatges_rebuts': len(latencies),
+            'missatges_perduts': perduts,
+            'proporcio_perduts': perduts / enviats if enviats else 0.0,
+            'errors': self.errors,
+            'latencia_p50_ms': percentile(latencies, 50) * 1000,
+            'latencia_p95_ms': percentile(latencies, 95) * 1000,
+            'latencia_p99_ms': percentile(latencies, 99) * 1000,
+            'latencia_max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+def run_stage(url, usuaris, tokens, args, sampler):
+    """Conecta len(usuaris) clientes, les hace chatear `durada` segundos y los desconecta."""
+    stats = StageStats()
+    clients = []
+    fallades = 0
+    pausa_rampa = 1 / args.rampa if args.rampa else 0
+
+    def connecta(i):
+        nonlocal fallades
+        id_usuari, _ = usuaris[i]
+        parella = usuaris[i + 1 if i % 2 == 0 else i - 1][1]
+        client = ChatClient(url, tokens[id_usuari], id_usuari, parella, stats)
+        try:
+            client.connect()
+            clients.append(client)
+        except Exception:
+            fallades += 1
+            client.close()
+
+    inici_connexio = time.monotonic()
+    pool = eventlet.GreenPool(len(usuaris))
+    for i in range(len(usuaris)):
+        pool.spawn(connecta, i)
+        if pausa_rampa:
+            time.sleep(pausa_rampa)
+    pool.waitall()
+    temps_connexio = time.monotonic() - inici_connexio
+
+    # Cada cliente envía `ritme` mensajes por segundo durante `durada` segundos
+    if sampler:
+        sampler.start()
+
+    def xateja(client):
+        interval = 1 / args.ritme
+        seguent = time.monotonic() + interval * (hash(client.id_usuari) % 1000) / 1000  # Reparte los envíos
+        final = time.monotonic() + args.durada
+        sequencia = 0
+        while time.monotonic() < final:
+            time.sleep(max(0, seguent - time.monotonic()))
+            try:
+                client.send(sequencia)
+            except Exception:
+                stats.errors += 1
+            sequencia += 1
+            seguent += interval
+
+    for client in clients:
+        pool.spawn(xateja, client)
+    pool.waitall()
+    time.sleep(args.espera_final)  # Deja llegar los últimos mensajes
+    servidor = sampler.stop() if sampler else {}
+
+    for client in clients:
+        pool.spawn(client.close)
+    pool.waitall()
+
+    resultat = {'clients': len(usuaris), 'connectats': len(clients), 'connexions_fallides': fallades,
+                'temps_connexio_s': temps_connexio}
+    resultat.update(stats.summary())
+    resultat.update(servidor)
+    return resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prova de càrrega del xat Socket.IO')
+    parser.add_argument('--mysql-host', default='127.0.0.1')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-user', default='root')
+    parser.add_argument('--mysql-password', default='')
+    parser.add_argument('--mysql-db', default='la_trobada_bench')
+    parser.add_argument('--crea-esquema', action='store_true', help='Esborra i crea la base de dades abans de començar')
+    parser.add_argument('--url', help='Servidor ja arrencat (per defecte se n\'arrenca un de local)')
+    parser.add_argument('--pid', type=int, help='PID del servidor de --url per mesurar-ne CPU i memòria')
+    parser.add_argument('--port', type=int, default=5099, help='Port del servidor local')
+    parser.add_argument('--write-behind', action='store_true', help='Servidor local amb CHAT_WRITE_BEHIND')
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 500, 1000], help='Clients de cada etapa')
+    parser.add_argument('--ritme', type=float, default=0.5, help='Missatges per segon de cada client')
+    parser.add_argument('--durada', type=float, default=30, help='Segons d\'enviament de cada etapa')
+    parser.add_argument('--rampa', type=float, default=200, help='Connexions noves per segon (0 = totes de cop)')
+    parser.add_argument('--espera-final', type=float, default=2, help='Segons d\'espera per als últims missatges')
+    parser.add_argument('--sortida', help='Desa l\'informe en JSON')
+    parser.add_argument('--servidor', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servidor:
+        run_server(args)
+        return
+
+    connect_args = {'host': args.mysql_host, 'port': args.mysql_port,
+                    'user': args.mysql_user, 'password': args.mysql_password}
+    if args.crea_esquema:
+        seed.create_schema(connect_args, args.mysql_db)
+    maxim = max(args.clients) + max(args.clients) % 2  # Siempre parejas completas
+    cnx = mysql.connector.connect(database=args.mysql_db, **connect_args)
+    try:
+        usuaris = seed_pairs(cnx, maxim)
+    finally:
+        cnx.close()
+    serializer = URLSafeTimedSerializer(Config.SECRET_KEY, salt=SALT)
+    tokens = {id_usuari: serializer.dumps({'id': id_usuari}) for id_usuari, _ in usuaris}
+
+    proces = None
+    if args.url:
+        url, pid = args.url, args.pid
+    else:
+        proces, url = start_server(args)
+        pid = proces.pid
+    sampler = ProcessSampler(pid) if pid and os.path.exists(f'/proc/{pid}') else None
+
+    etapes = []
+    try:
+        for clients in args.clients:
+            clients += clients % 2
+            resultat = run_stage(url, usuaris[:clients], tokens, args, sampler)
+            etapes.append(resultat)
+            print(f"{clients} clients: {resultat['connectats']} connectats, "
+                  f"p50 {resultat['latencia_p50_ms']:.1f} ms, p99 {resultat['latencia_p99_ms']:.1f} ms, "
+                  f"{resultat['missatges_perduts']} perduts, CPU {resultat.get('cpu_mitjana_pct') or 0:.0f}%")
+    finally:
+        if proces:
+            proces.terminate()  # El servidor guarda los mensajes pendientes al recibir SIGTERM
+            try:
+                proces.wait(10)
+            except subprocess.TimeoutExpired:
+                proces.kill()
+
+    if args.sortida:
+        with open(args.sortida, 'w', encoding='utf-8') as f:
+            json.dump({
+                'commit': git_commit(),
+                'data': datetime.now().isoformat(timespec='seconds'),
+                'ritme': args.ritme,
+                'durada': args.durada,
+                'write_behind': args.write_behind,
+                'etapes': etapes,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"Informe desat a {args.sortida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+-- Esquema base de la_trobada per als benchmarks (les taules tal com eren abans
+-- de les migracions de sql/). El banc de proves hi aplica després sql/*.sql
+-- en ordre, de manera que sempre mesura l'esquema actual.
+
+CREATE TABLE usuari (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nom_usuari VARCHAR(64) NOT NULL UNIQUE,
+    correu VARCHAR(255) NOT NULL UNIQUE,
+    contrasenya VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE cartes (
+    id_carta INT PRIMARY KEY
+);
+
+CREATE TABLE coleccio (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    id_user INT NOT NULL,
+    nombre VARCHAR(255) NOT NULL,
+    INDEX idx_coleccio_user (id_user)
+);
+
+CREATE TABLE coleccio_cartes (
+    id_coleccio INT NOT NULL,
+    id_carta INT NOT NULL
+);
+
+CREATE TABLE conversaciones (
+    id_conversacion INT AUTO_INCREMENT PRIMARY KEY,
+    id_usuario1 INT NOT NULL,
+    id_usuario2 INT NOT NULL
+);
+
+CREATE TABLE mensajes_privados (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    id_conversacion INT NOT NULL,
+    id_remitente INT NOT NULL,
+    mensaje TEXT NOT NULL,
+    fecha_envio DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE foro (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    id_user INT NOT NULL,
+    mensaje TEXT NOT NULL
+);
+
+CREATE TABLE eventos (
+    id_evento INT AUTO_INCREMENT PRIMARY KEY,
+    id_creador INT NOT NULL,
+    titulo VARCHAR(255) NOT NULL,
+    descripcion TEXT NULL,
+    fecha_evento DATETIME NOT NULL,
+    localizacion VARCHAR(255) NULL
+);
+
+CREATE TABLE evento_participantes (
+    id_evento INT NOT NULL,
+    id_usuario INT NOT NULL
+);
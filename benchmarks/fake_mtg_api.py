@@ -0,0 +1,96 @@
+# Servidor HTTP local que imita la API de magicthegathering.io (/v1/cards) para
+# los benchmarks: respuestas deterministas, sin red y con latencia configurable.
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+COLORS = ('White', 'Blue', 'Black', 'Red', 'Green')
+RARESES = ('Common', 'Uncommon', 'Rare', 'Mythic Rare')
+
+
+def fake_card(multiverse_id):
+    """Carta sintética (siempre la misma para el mismo id)."""
+    return {
+        'multiverseid': multiverse_id,
+        'name': f'Carta de prova {multiverse_id}',
+        'imageUrl': f'http://gatherer.invalid/Handlers/Image.ashx?multiverseid={multiverse_id}&type=card',
+        'set': f'S{multiverse_id % 50:02d}',
+        'setName': f'Expansió {multiverse_id % 50}',
+        'type': 'Creature — Test',
+        'manaCost': '{' + str(multiverse_id % 7) + '}',
+        'cmc': multiverse_id % 7,
+        'colors': [COLORS[multiverse_id % len(COLORS)]],
+        'rarity': RARESES[multiverse_id % len(RARESES)],
+    }
+
+
+class FakeMtgApi:
+    """API falsa con `total` cartas (ids 1..total) en http://host:port/v1.
+
+    Atiende multiverseid=a|b|c, name=... y page/pageSize, que es lo que usan
+    app.cataleg y app.magic_api. `latencia` añade una espera por petición para
+    simular la API real.
+    """
+
+    def __init__(self, total=20000, host='127.0.0.1', port=0, latencia=0.0):
+        self.total = total
+        self.latencia = latencia
+        self.peticions = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                api.peticions += 1
+                url = urlparse(self.path)
+                if url.path.rstrip('/') != '/v1/cards':
+                    self.send_error(404)
+                    return
+                if api.latencia:
+                    time.sleep(api.latencia)
+                cos = json.dumps({'cards': api.cards(parse_qs(url.query))}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cos)))
+                self.end_headers()
+                self.wfile.write(cos)
+
+            def log_message(self, *args):
+                pass  # Sin una línea por petición
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f'http://{host}:{self.server.server_address[1]}/v1'
+        self._thread = None
+
+    def cards(self, params):
+        mida = int(params.get('pageSize', ['100'])[0])
+        pagina = int(params.get('page', ['1'])[0])
+        if 'multiverseid' in params:
+            ids = [int(i) for i in params['multiverseid'][0].split('|') if i.isdigit()]
+            ids = [i for i in ids if 1 <= i <= self.total]
+        elif 'name' in params:
+            # "Carta de prova 123" -> la carta 123; cualquier otro nombre no existe
+            nom = params['name'][0].rsplit(' ', 1)[-1]
+            ids = [int(nom)] if nom.isdigit() and 1 <= int(nom) <= self.total else []
+        else:
+            ids = range(1, self.total + 1)
+        inici = (pagina - 1) * mida
+        return [fake_card(i) for i in list(ids)[inici:inici + mida]]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def install(self):
+        """Hace que mtgsdk use esta API (querybuilder copia __endpoint__ al importarse)."""
+        import mtgsdk.config
+        import mtgsdk.querybuilder
+        mtgsdk.config.__endpoint__ = self.url
+        mtgsdk.querybuilder.__endpoint__ = self.url
+        return self
@@ -0,0 +1,149 @@
+# Crea la base de datos de benchmarks (esquema base + migraciones de sql/) y la
+# llena con volúmenes realistas. Todo es determinista (misma semilla, mismos datos)
+# para que los resultados se puedan comparar entre commits.
+import glob
+import os
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+import bcrypt
+import mysql.connector
+from mtgsdk import Card
+from app.cataleg import UPSERT_CARTES, card_to_row
+from app.xat import update_summaries
+from benchmarks.fake_mtg_api import fake_card
+
+ARREL = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ESQUEMA_BASE = os.path.join(ARREL, 'benchmarks', 'esquema_base.sql')
+MIGRACIONS = os.path.join(ARREL, 'sql', '*.sql')
+
+CONTRASENYA = 'bench'  # Contraseña de todos los usuarios sembrados
+MIDA_LOT = 1000  # Filas por executemany
+
+# Volúmenes de cada perfil
+PERFILS = {
+    'petit': {
+        'usuaris': 50, 'cataleg': 2000, 'cartes_coleccio': 1000, 'foro': 5000,
+        'converses': 50, 'missatges_xat': 5000, 'eventos': 200, 'participants': 10,
+    },
+    'gran': {
+        'usuaris': 1000, 'cataleg': 20000, 'cartes_coleccio': 10000, 'foro': 200000,
+        'converses': 500, 'missatges_xat': 100000, 'eventos': 5000, 'participants': 30,
+    },
+}
+
+
+def split_statements(sql):
+    """Separa un fichero .sql en sentencias (las migraciones no usan delimitadores propios)."""
+    linies = [linia for linia in sql.splitlines() if not linia.strip().startswith('--')]
+    return [sentencia.strip() for sentencia in '\n'.join(linies).split(';') if sentencia.strip()]
+
+
+def create_schema(connect_args, database):
+    """Crea de cero la base de datos y aplica el esquema base y sql/*.sql en orden."""
+    cnx = mysql.connector.connect(**connect_args)
+    try:
+        with cnx.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+            cursor.execute(f"CREATE DATABASE `{database}` CHARACTER SET utf8mb4")
+            cursor.execute(f"USE `{database}`")
+            for fitxer in [ESQUEMA_BASE] + sorted(glob.glob(MIGRACIONS)):
+                with open(fitxer, encoding='utf-8') as f:
+                    for sentencia in split_statements(f.read()):
+                        cursor.execute(sentencia)
+                print(f"Aplicat {os.path.relpath(fitxer, ARREL)}")
+        cnx.commit()
+    finally:
+        cnx.close()
+
+
+def _insert(cursor, sql, files):
+    for i in range(0, len(files), MIDA_LOT):
+        cursor.executemany(sql, files[i:i + MIDA_LOT])
+
+
+def seed(cnx, perfil, llavor=1234):
+    """Llena la base de datos con el perfil indicado."""
+    mides = PERFILS[perfil]
+    rnd = random.Random(llavor)
+    hash_contrasenya = bcrypt.hashpw(CONTRASENYA.encode('utf-8'), bcrypt.gensalt(4)).decode('utf-8')
+    ara = datetime(2025, 1, 1, 12, 0, 0)
+
+    with cnx.cursor() as cursor:
+        # Usuarios bench0..benchN
+        _insert(cursor, "INSERT INTO usuari (nom_usuari, correu, contrasenya) VALUES (%s, %s, %s)",
+                [(f'bench{i}', f'bench{i}@example.com', hash_contrasenya) for i in range(mides['usuaris'])])
+        cursor.execute("SELECT id FROM usuari ORDER BY id")
+        usuaris = [fila[0] for fila in cursor.fetchall()]
+
+        # Catálogo local (los ids de la API falsa)
+        _insert(cursor, UPSERT_CARTES,
+                [card_to_row(Card(fake_card(i))) for i in range(1, mides['cataleg'] + 1)])
+
+        # Colección grande de bench0
+        cursor.execute("INSERT INTO coleccio (id_user, nombre) VALUES (%s, %s)", (usuaris[0], 'Col·lecció gran'))
+        id_col = cursor.lastrowid
+        copies = Counter(rnd.randint(1, mides['cataleg']) for _ in range(mides['cartes_coleccio']))
+        _insert(cursor, "INSERT INTO coleccio_cartes (id_coleccio, id_carta, quantitat) VALUES (%s, %s, %s)",
+                [(id_col, id_carta, quantitat) for id_carta, quantitat in sorted(copies.items())])
+
+        # Foro
+        _insert(cursor, "INSERT INTO foro (id_user, mensaje) VALUES (%s, %s)",
+                [(rnd.choice(usuaris), f'Missatge del fòrum {i}') for i in range(mides['foro'])])
+
+        # Bandeja de entrada de bench0: una conversación larga y muchas cortas
+        contactes = [usuaris[1 + i % (len(usuaris) - 1)] for i in range(mides['converses'])]
+        contactes = list(dict.fromkeys(contactes))
+        _insert(cursor, "INSERT INTO conversaciones (id_usuario1, id_usuario2) VALUES (%s, %s)",
+                [(usuaris[0], contacte) for contacte in contactes])
+        cursor.execute("SELECT id_conversacion, id_usuario2 FROM conversaciones WHERE id_usuario1 = %s ORDER BY id_conversacion",
+                       (usuaris[0],))
+        converses = cursor.fetchall()
+        id_conversacion = converses[0][0]
+        missatges = []
+        for i in range(mides['missatges_xat']):
+            remitent = usuaris[0] if i % 2 else converses[0][1]
+            missatges.append((id_conversacion, remitent, f'Missatge {i}', ara - timedelta(seconds=mides['missatges_xat'] - i)))
+        for n, (id_conv, contacte) in enumerate(converses[1:]):
+            for i in range(5):
+                missatges.append((id_conv, contacte if i % 2 else usuaris[0], f'Hola {i}', ara - timedelta(hours=n, minutes=i)))
+        _insert(cursor, "INSERT INTO mensajes_privados (id_conversacion, id_remitente, mensaje, fecha_envio) VALUES (%s, %s, %s, %s)",
+                missatges)
+        ids_converses = [fila[0] for fila in converses]
+        for i in range(0, len(ids_converses), MIDA_LOT):
+            update_summaries(cursor, ids_converses[i:i + MIDA_LOT])
+
+        # Eventos (pasados y futuros) con participantes
+        _insert(cursor, "INSERT INTO eventos (id_creador, titulo, descripcion, fecha_evento, localizacion) VALUES (%s, %s, %s, %s, %s)",
+                [(rnd.choice(usuaris), f'Torneig {i}', 'Format modern', ara + timedelta(days=rnd.randint(-365, 365)),
+                  rnd.choice(('Barcelona', 'Girona', 'Lleida', 'Tarragona'))) for i in range(mides['eventos'])])
+        cursor.execute("SELECT id_evento FROM eventos")
+        participants = []
+        for (id_evento,) in cursor.fetchall():
+            for usuari in rnd.sample(usuaris, min(mides['participants'], len(usuaris))):
+                participants.append((id_evento, usuari))
+        _insert(cursor, "INSERT INTO evento_participantes (id_evento, id_usuario) VALUES (%s, %s)", participants)
+    cnx.commit()
+
+
+def context(cnx):
+    """Ids que usan los escenarios (de una base de datos ya sembrada)."""
+    with cnx.cursor() as cursor:
+        cursor.execute("SELECT id FROM usuari WHERE nom_usuari IN ('bench0', 'bench1') ORDER BY nom_usuari")
+        usuaris = [fila[0] for fila in cursor.fetchall()]
+        if len(usuaris) < 2:
+            raise RuntimeError('La base de dades no està sembrada (falten bench0 i bench1)')
+        cursor.execute("SELECT MIN(id) FROM coleccio WHERE id_user = %s", (usuaris[0],))
+        id_col = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT id_conversacion FROM conversaciones
+            WHERE usuari_min = LEAST(%s, %s) AND usuari_max = GREATEST(%s, %s)
+        """, (usuaris[0], usuaris[1], usuaris[0], usuaris[1]))
+        id_conversacion = cursor.fetchone()[0]
+    return {
+        'usuari': 'bench0',
+        'contacte': 'bench1',
+        'id_usuari': usuaris[0],
+        'id_coleccio': id_col,
+        'id_conversacion': id_conversacion,
+    }
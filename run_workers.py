@@ -0,0 +1,94 @@
+# Arranca varios workers de la aplicación (uno por núcleo) que comparten las salas de
+# Socket.IO a través de la cola de mensajes de Config.SOCKETIO_MESSAGE_QUEUE.
+#
+# Los clientes Socket.IO necesitan sesiones persistentes ("sticky"): todas las
+# peticiones de un cliente deben llegar al mismo worker. Con --nginx se genera la
+# configuración de un balanceador nginx con ip_hash que reparte entre los workers.
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+
+ESPERA_ATURADA = 15  # Segundos que se espera a cada worker (guardar mensajes pendientes) antes de matarlo
+
+
+def worker(host, port):
+    import eventlet  # Importa eventlet antes de cualquier otra cosa
+    eventlet.monkey_patch()  # Aplica el parcheo en cada worker
+
+    from app import create_app, socketio
+    app = create_app()
+    socketio.run(app, host=host, port=port)
+
+
+def nginx_config(host, ports, listen):
+    servidors = '\n'.join(f'        server {host}:{port};' for port in ports)
+    return f"""upstream la_trobada {{
+        ip_hash;  # Sesiones persistentes: cada cliente va siempre al mismo worker
+{servidors}
+    }}
+
+    server {{
+        listen {listen};
+
+        location / {{
+            proxy_pass http://la_trobada;
+            proxy_http_version 1.1;
+            proxy_set_header Upgrade $http_upgrade;
+            proxy_set_header Connection "upgrade";
+            proxy_set_header Host $host;
+            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        }}
+    }}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Arrenca diversos workers de La Trobada')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='nombre de workers')
+    parser.add_argument('--host', default='127.0.0.1', help='adreça on escolten els workers')
+    parser.add_argument('--port', type=int, default=5001, help='port del primer worker (la resta, consecutius)')
+    parser.add_argument('--cua', default=os.environ.get('SOCKETIO_MESSAGE_QUEUE'),
+                        help='URL de la cua de missatges (p. ex. redis://localhost:6379/0)')
+    parser.add_argument('--nginx', metavar='FITXER', help='escriu la configuració de nginx per al balanceig')
+    parser.add_argument('--nginx-port', type=int, default=5000, help='port públic de nginx')
+    args = parser.parse_args()
+
+    if args.workers > 1 and (not args.cua or args.cua.startswith('memory://')):
+        sys.exit('Amb més d\'un worker cal una cua de missatges compartida (--cua redis://...)')
+    if args.cua:
+        os.environ['SOCKETIO_MESSAGE_QUEUE'] = args.cua  # La llegeix Config a cada worker
+
+    ports = [args.port + i for i in range(args.workers)]
+    if args.nginx:
+        with open(args.nginx, 'w') as fitxer:
+            fitxer.write(nginx_config(args.host, ports, args.nginx_port))
+        print(f"Configuració de nginx escrita a {args.nginx}")
+
+    # 'spawn' per no heretar l'estat d'eventlet ni connexions del procés pare
+    context = multiprocessing.get_context('spawn')
+    processos = [context.Process(target=worker, args=(args.host, port), name=f'worker-{port}') for port in ports]
+    for proces in processos:
+        proces.start()
+        print(f"Worker {proces.name} (pid {proces.pid}) a {args.host}:{proces.name.split('-')[1]}")
+
+    def aturar(signum, frame):
+        # SIGTERM a todos; cada worker guarda los mensajes pendientes del chat antes de salir
+        for proces in processos:
+            if proces.is_alive():
+                proces.terminate()
+        for proces in processos:
+            proces.join(ESPERA_ATURADA)
+            if proces.is_alive():
+                print(f"Worker {proces.name} no s'ha aturat en {ESPERA_ATURADA} s, es mata")
+                proces.kill()
+
+    signal.signal(signal.SIGINT, aturar)
+    signal.signal(signal.SIGTERM, aturar)
+    for proces in processos:
+        proces.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+-- Catàleg local de cartes: amplia la taula `cartes` amb les dades de mtgsdk
+-- perquè les col·leccions es puguin resoldre sense cridar l'API remota.
+
+ALTER TABLE cartes
+    ADD COLUMN nom VARCHAR(255) NULL,
+    ADD COLUMN imatge VARCHAR(512) NULL,
+    ADD COLUMN expansio VARCHAR(16) NULL,
+    ADD COLUMN nom_expansio VARCHAR(255) NULL,
+    ADD COLUMN tipus VARCHAR(255) NULL,
+    ADD COLUMN cost_mana VARCHAR(64) NULL,
+    ADD COLUMN cmc DECIMAL(5, 1) NULL,
+    ADD COLUMN colors VARCHAR(32) NULL,
+    ADD COLUMN raresa VARCHAR(32) NULL,
+    ADD COLUMN actualitzat TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+CREATE INDEX idx_cartes_nom ON cartes (nom);
+CREATE INDEX idx_coleccio_cartes_coleccio ON coleccio_cartes (id_coleccio, id_carta);
@@ -0,0 +1,9 @@
+-- Punt de control de la importació del catàleg de cartes: guarda l'última
+-- pàgina de l'API que s'ha desat perquè una importació interrompuda continuï.
+
+CREATE TABLE IF NOT EXISTS importacio_estat (
+    nom VARCHAR(64) NOT NULL PRIMARY KEY,
+    ultima_pagina INT NOT NULL DEFAULT 0,
+    cartes_desades INT NOT NULL DEFAULT 0,
+    actualitzat TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
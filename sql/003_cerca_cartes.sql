@@ -0,0 +1,16 @@
+-- Índex de cerca per nom: nom normalitzat (minúscules, sense accents ni
+-- espais repetits) per a cerques exactes i per prefix sense dependre de
+-- l'API remota. La importació (python -m app.magic_api) l'omple per a les
+-- cartes noves.
+--
+-- IMPORTANT: l'UPDATE d'aquí només és una aproximació (no treu accents, no
+-- converteix æ ni junta espais). Abans de fer servir la columna cal executar
+--     python -m app.magic_api --normalitza
+-- que la recalcula amb la mateixa funció que la cerca (app.cataleg.normalize_name).
+
+ALTER TABLE cartes
+    ADD COLUMN nom_normalitzat VARCHAR(255) NULL AFTER nom;
+
+UPDATE cartes SET nom_normalitzat = LOWER(TRIM(nom)) WHERE nom IS NOT NULL;
+
+CREATE INDEX idx_cartes_nom_normalitzat ON cartes (nom_normalitzat);
@@ -0,0 +1,5 @@
+-- Índexs per al llistat d'esdeveniments: ordenació i filtre per data, i
+-- càrrega dels participants de diversos esdeveniments d'un sol cop.
+
+CREATE INDEX idx_eventos_fecha ON eventos (fecha_evento, id_evento);
+CREATE INDEX idx_evento_participantes_evento ON evento_participantes (id_evento, id_usuario);
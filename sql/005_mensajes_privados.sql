@@ -0,0 +1,4 @@
+-- Índex compost per paginar l'historial d'una conversa per id
+-- (before / after / since) sense recórrer tots els missatges.
+
+CREATE INDEX idx_mensajes_conversacion_id ON mensajes_privados (id_conversacion, id);
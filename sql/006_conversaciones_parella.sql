@@ -0,0 +1,34 @@
+-- Representació canònica de cada conversa com a parella ordenada
+-- (usuari_min, usuari_max) amb un índex únic, perquè trobar la conversa entre
+-- dos usuaris sigui una sola cerca per índex en lloc d'un OR simètric.
+
+-- 1. Si hi ha converses duplicades per a la mateixa parella, es conserva la més
+--    antiga i s'hi mouen els missatges de les altres.
+CREATE TEMPORARY TABLE conversaciones_canoniques AS
+    SELECT LEAST(id_usuario1, id_usuario2) AS usuari_min,
+           GREATEST(id_usuario1, id_usuario2) AS usuari_max,
+           MIN(id_conversacion) AS id_conversacion
+    FROM conversaciones
+    GROUP BY usuari_min, usuari_max;
+
+UPDATE mensajes_privados m
+JOIN conversaciones c ON c.id_conversacion = m.id_conversacion
+JOIN conversaciones_canoniques k
+    ON k.usuari_min = LEAST(c.id_usuario1, c.id_usuario2)
+   AND k.usuari_max = GREATEST(c.id_usuario1, c.id_usuario2)
+SET m.id_conversacion = k.id_conversacion
+WHERE m.id_conversacion <> k.id_conversacion;
+
+DELETE c FROM conversaciones c
+JOIN conversaciones_canoniques k
+    ON k.usuari_min = LEAST(c.id_usuario1, c.id_usuario2)
+   AND k.usuari_max = GREATEST(c.id_usuario1, c.id_usuario2)
+WHERE c.id_conversacion <> k.id_conversacion;
+
+DROP TEMPORARY TABLE conversaciones_canoniques;
+
+-- 2. Columnes generades amb la parella ordenada i índex únic.
+ALTER TABLE conversaciones
+    ADD COLUMN usuari_min INT GENERATED ALWAYS AS (LEAST(id_usuario1, id_usuario2)) STORED,
+    ADD COLUMN usuari_max INT GENERATED ALWAYS AS (GREATEST(id_usuario1, id_usuario2)) STORED,
+    ADD UNIQUE INDEX uq_conversaciones_parella (usuari_min, usuari_max);
@@ -0,0 +1,39 @@
+-- Resum de cada conversa (últim missatge i activitat) per llistar la safata
+-- d'entrada amb una sola consulta, i punter de lectura per usuari per comptar
+-- els missatges no llegits.
+
+ALTER TABLE conversaciones
+    ADD COLUMN ultimo_mensaje_id INT NULL,
+    ADD COLUMN ultimo_mensaje TEXT NULL,
+    ADD COLUMN ultimo_remitente INT NULL,
+    ADD COLUMN actividad DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ADD INDEX idx_conversaciones_min_actividad (usuari_min, actividad, id_conversacion),
+    ADD INDEX idx_conversaciones_max_actividad (usuari_max, actividad, id_conversacion);
+
+-- Últim missatge llegit per cada usuari de cada conversa.
+CREATE TABLE conversaciones_lectura (
+    id_conversacion INT NOT NULL,
+    id_usuario INT NOT NULL,
+    ultimo_leido INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_conversacion, id_usuario)
+);
+
+-- Omple el resum amb els missatges existents.
+UPDATE conversaciones c
+JOIN (
+    SELECT id_conversacion, MAX(id) AS id
+    FROM mensajes_privados
+    GROUP BY id_conversacion
+) u ON u.id_conversacion = c.id_conversacion
+JOIN mensajes_privados m ON m.id = u.id
+SET c.ultimo_mensaje_id = m.id,
+    c.ultimo_mensaje = m.mensaje,
+    c.ultimo_remitente = m.id_remitente,
+    c.actividad = m.fecha_envio;
+
+-- Els missatges antics es consideren llegits.
+INSERT INTO conversaciones_lectura (id_conversacion, id_usuario, ultimo_leido)
+    SELECT id_conversacion, id_usuario1, COALESCE(ultimo_mensaje_id, 0) FROM conversaciones
+    UNION ALL
+    SELECT id_conversacion, id_usuario2, COALESCE(ultimo_mensaje_id, 0) FROM conversaciones
+    WHERE id_usuario2 <> id_usuario1;
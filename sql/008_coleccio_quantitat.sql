@@ -0,0 +1,53 @@
+-- Col·leccions compactes: una fila per (col·lecció, carta) amb la quantitat de
+-- còpies en lloc d'una fila per còpia. Els duplicats existents es fusionen.
+-- Es modifica la taula existent (no es recrea) perquè conservi les claus
+-- foranes, el ON DELETE CASCADE i els índexs que ja té.
+
+ALTER TABLE coleccio_cartes
+    ADD COLUMN quantitat INT NOT NULL DEFAULT 1;
+
+-- Si la taula ja tenia clau primària (p. ex. un `id` per còpia) es treu: les
+-- columnes de la clau que no són (id_coleccio, id_carta) s'esborren i, si encara
+-- en queda una, es descarta abans de crear la nova
+SET @sentencia = (
+    SELECT IF(COUNT(*) = 0, 'DO 0',
+              CONCAT('ALTER TABLE coleccio_cartes ', GROUP_CONCAT(CONCAT('DROP COLUMN `', COLUMN_NAME, '`'))))
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'coleccio_cartes'
+      AND CONSTRAINT_NAME = 'PRIMARY' AND COLUMN_NAME NOT IN ('id_coleccio', 'id_carta')
+);
+PREPARE sentencia FROM @sentencia;
+EXECUTE sentencia;
+DEALLOCATE PREPARE sentencia;
+
+SET @sentencia = (
+    SELECT IF(COUNT(*) = 0, 'DO 0', 'ALTER TABLE coleccio_cartes DROP PRIMARY KEY')
+    FROM information_schema.TABLE_CONSTRAINTS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'coleccio_cartes'
+      AND CONSTRAINT_TYPE = 'PRIMARY KEY'
+);
+PREPARE sentencia FROM @sentencia;
+EXECUTE sentencia;
+DEALLOCATE PREPARE sentencia;
+
+-- Parelles repetides i quantes còpies en tenen
+CREATE TEMPORARY TABLE coleccio_cartes_duplicades AS
+    SELECT id_coleccio, id_carta, COUNT(*) AS quantitat
+    FROM coleccio_cartes
+    GROUP BY id_coleccio, id_carta
+    HAVING COUNT(*) > 1;
+
+-- Es treuen totes les còpies i es torna a inserir una sola fila amb el total
+DELETE cc FROM coleccio_cartes cc
+JOIN coleccio_cartes_duplicades d ON d.id_coleccio = cc.id_coleccio AND d.id_carta = cc.id_carta;
+
+INSERT INTO coleccio_cartes (id_coleccio, id_carta, quantitat)
+    SELECT id_coleccio, id_carta, quantitat FROM coleccio_cartes_duplicades;
+
+DROP TEMPORARY TABLE coleccio_cartes_duplicades;
+
+ALTER TABLE coleccio_cartes
+    ADD PRIMARY KEY (id_coleccio, id_carta);
+
+-- La clau primària ja cobreix (id_coleccio, id_carta): l'índex de sql/001 sobra
+DROP INDEX idx_coleccio_cartes_coleccio ON coleccio_cartes;